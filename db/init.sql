@@ -66,7 +66,7 @@ CREATE TABLE embeddings (
 CREATE TABLE faces (
     id SERIAL PRIMARY KEY,
     scene_id INTEGER REFERENCES scenes(id) ON DELETE CASCADE,
-    embedding vector(512),  -- ArcFace (fixed 512-dim)
+    embedding halfvec(512),  -- ArcFace (fixed 512-dim, fp16 halves storage)
     bbox_x FLOAT,
     bbox_y FLOAT,
     bbox_w FLOAT,
@@ -89,6 +89,22 @@ CREATE TABLE enrichment_queue (
     total_stages INTEGER            -- Total stages for this file (based on enabled models)
 );
 
+-- FFprobe results keyed by content fingerprint (size:mtime_ns:blake2b of first 64KB)
+-- so renamed/moved files and re-added files skip ffprobe
+CREATE TABLE probe_cache (
+    fingerprint TEXT PRIMARY KEY,
+    metadata JSONB,
+    created_at TIMESTAMP DEFAULT NOW()
+);
+
+-- Directory listing cache for rescans (skip scandir when a directory's mtime is unchanged)
+CREATE TABLE scan_directories (
+    path TEXT PRIMARY KEY,
+    mtime DOUBLE PRECISION,     -- st_mtime when the listing was taken
+    subdirs TEXT[],             -- Immediate subdirectory paths
+    videos TEXT[]               -- Immediate video file paths
+);
+
 -- Config (watch folders, settings)
 CREATE TABLE config (
     key TEXT PRIMARY KEY,
@@ -106,6 +122,12 @@ INSERT INTO config (key, value) VALUES
     ('poster_width', '1280'),            -- 720p width
     ('poster_format', '"webp"'),
     ('poster_quality', '80'),
+    ('parallel_stages', 'true'),         -- Run Whisper alongside CLIP during enrichment
+    ('enrichment_workers', '1'),         -- Files enriched in parallel (each worker loads its own models)
+    ('pipeline_stages', 'false'),        -- Run each enrichment stage on its own thread across files
+    ('scan_directory_cache', 'true'),    -- Reuse listings of directories whose mtime hasn't changed
+    ('scan_skip_unchanged_files', 'false'), -- Don't stat files in those directories (misses in-place rewrites)
+    ('scene_detector', '"pyscenedetect"'), -- pyscenedetect, or ffmpeg (scene score filter, faster)
     -- Search threshold defaults (cosine similarity, 0-1 range)
     ('search_threshold_visual', '0.10'),       -- CLIP text-to-image search
     ('search_threshold_visual_match', '0.20'), -- Scene-to-scene visual similarity
@@ -123,3 +145,14 @@ CREATE INDEX idx_embeddings_model ON embeddings (model_name);
 
 -- Index for queue processing
 CREATE INDEX ON enrichment_queue (status, queued_at);
+
+-- Prefix lookups of files under a watch folder (path LIKE '/folder/%' in the scanner)
+CREATE INDEX IF NOT EXISTS idx_files_path_pattern ON files (path text_pattern_ops);
+
+-- Faces by scene (per-file face DELETE in detect_faces_for_file, scene face lookups, cascades)
+CREATE INDEX IF NOT EXISTS idx_faces_scene ON faces (scene_id);
+
+-- Partial index for pending job pickup (WHERE status = 'pending' ORDER BY queued_at)
+-- The embeddings anti-join on (scene_id, model_name) is served by its UNIQUE constraint
+CREATE INDEX IF NOT EXISTS idx_enrichment_queue_pending
+    ON enrichment_queue (queued_at) WHERE status = 'pending';
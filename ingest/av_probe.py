@@ -0,0 +1,66 @@
+"""
+In-process video probing with PyAV (optional dependency, `pip install av`).
+Reads the same fields as scanner.get_video_metadata's ffprobe call, without
+spawning a process per file. scanner falls back to ffprobe when this is missing.
+"""
+
+import av
+
+# FFmpeg AVColor* enum values -> the names ffprobe reports (unspecified/reserved -> None)
+COLOR_PRIMARIES = {
+    1: 'bt709', 4: 'bt470m', 5: 'bt470bg', 6: 'smpte170m', 7: 'smpte240m', 8: 'film',
+    9: 'bt2020', 10: 'smpte428', 11: 'smpte431', 12: 'smpte432', 22: 'jedec-p22',
+}
+COLOR_TRANSFER = {
+    1: 'bt709', 4: 'gamma22', 5: 'gamma28', 6: 'smpte170m', 7: 'smpte240m', 8: 'linear',
+    9: 'log100', 10: 'log316', 11: 'iec61966-2-4', 12: 'bt1361e', 13: 'iec61966-2-1',
+    14: 'bt2020-10', 15: 'bt2020-12', 16: 'smpte2084', 17: 'smpte428', 18: 'arib-std-b67',
+}
+COLOR_SPACE = {
+    0: 'gbr', 1: 'bt709', 4: 'fcc', 5: 'bt470bg', 6: 'smpte170m', 7: 'smpte240m', 8: 'ycgco',
+    9: 'bt2020nc', 10: 'bt2020c', 11: 'smpte2085', 12: 'chroma-derived-nc',
+    13: 'chroma-derived-c', 14: 'ictcp',
+}
+
+
+def probe(video_path):
+    """
+    Get video metadata in the same shape as scanner.get_video_metadata.
+    Raises if PyAV can't open the file or read a duration (caller falls back to ffprobe).
+    """
+    with av.open(video_path) as container:
+        if container.duration is None:
+            raise ValueError("no container duration")
+
+        metadata = {
+            'duration_seconds': container.duration / av.time_base,
+            'width': None,
+            'height': None,
+            'fps': None,
+            'codec': None,
+            'audio_tracks': len(container.streams.audio),
+            'pix_fmt': None,
+            'color_space': None,
+            'color_transfer': None,
+            'color_primaries': None
+        }
+
+        # Get stream info (first video stream)
+        if container.streams.video:
+            stream = container.streams.video[0]
+            codec = stream.codec_context
+            metadata['width'] = codec.width or None
+            metadata['height'] = codec.height or None
+            metadata['codec'] = codec.name
+
+            # base_rate is ffprobe's r_frame_rate
+            if stream.base_rate:
+                metadata['fps'] = round(float(stream.base_rate), 3)
+
+            # Color metadata
+            metadata['pix_fmt'] = codec.pix_fmt
+            metadata['color_space'] = COLOR_SPACE.get(getattr(codec, 'colorspace', None))
+            metadata['color_transfer'] = COLOR_TRANSFER.get(getattr(codec, 'color_trc', None))
+            metadata['color_primaries'] = COLOR_PRIMARIES.get(getattr(codec, 'color_primaries', None))
+
+        return metadata
@@ -1,12 +1,20 @@
 """
 CLIP embedding generation for visual search.
 Uses OpenCLIP with ViT-B-32 model (MPS on Apple Silicon, CPU fallback).
+On MPS the model runs in fp16; embeddings are normalized in fp32.
 """
 
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import open_clip
 import torch
+import torch.nn.functional as F
 from PIL import Image
+from psycopg2.extras import execute_values
 from db import get_connection
+from scene_detect import clip_poster_path
 from progress import progress_counter, progress_done
 
 # Model info (for embeddings table)
@@ -14,11 +22,31 @@ MODEL_NAME = 'clip'
 MODEL_VERSION = 'ViT-B-32-laion2b_s34b_b79k'
 MODEL_DIMENSION = 512
 
+# Posters encoded per forward pass
+BATCH_SIZE = 32
+
+# Scenes fetched per server-side cursor round trip
+STREAM_SIZE = 256
+
+# Embedding rows per upsert statement / max chunks buffered for the writer thread
+WRITE_BATCH_SIZE = 500
+WRITE_QUEUE_SIZE = 8
+
+# Background threads decoding/preprocessing posters while the model runs
+# (PIL decode/resize and the tensor transforms release the GIL)
+LOADER_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+
+# Dynamic int8 quantization of Linear layers on CPU (opt in with CLIP_QUANTIZE=true).
+# Off by default: stored image embeddings are compared against fp32 text/query embeddings
+QUANTIZE_CPU = os.environ.get('CLIP_QUANTIZE', 'false').lower() == 'true'
+
 # Global model (loaded once)
 _model = None
 _preprocess = None
 _tokenizer = None
 _device = None
+_image_encoder = None
+_loader_pool = None
 
 
 def get_device():
@@ -28,6 +56,20 @@ def get_device():
     return torch.device("cpu")
 
 
+def get_dtype(device):
+    """Get inference dtype for device (fp16 on MPS, fp32 on CPU)."""
+    if device.type == "mps":
+        return torch.float16
+    return torch.float32
+
+
+def get_memory_format(device):
+    """Get image tensor memory format (NHWC on CPU for oneDNN conv kernels)."""
+    if device.type == "cpu":
+        return torch.channels_last
+    return torch.contiguous_format
+
+
 def load_model():
     """Load CLIP model (ViT-B-32). Downloads on first run (~400MB)."""
     global _model, _preprocess, _tokenizer, _device
@@ -45,29 +87,158 @@ def load_model():
     _tokenizer = open_clip.get_tokenizer('ViT-B-32')
 
     _model.eval()
-    _model.to(_device)
+    _model.to(_device, dtype=get_dtype(_device), memory_format=get_memory_format(_device))
+
+    if _device.type == "cpu" and QUANTIZE_CPU:
+        # int8 weights / fp32 activations via FBGEMM - matmuls are memory-bandwidth bound on CPU
+        _model = torch.ao.quantization.quantize_dynamic(_model, {torch.nn.Linear}, dtype=torch.qint8)
 
     print(f"    ✓ CLIP model loaded on {_device}")
     return _model, _preprocess, _tokenizer, _device
 
 
+def load_image_encoder():
+    """
+    Get the CLIP image encoder, JIT-traced once to cut per-op dispatch overhead.
+    Falls back to the eager encoder if tracing fails.
+    """
+    global _image_encoder
+
+    if _image_encoder is not None:
+        return _image_encoder
+
+    model, _, _, device = load_model()
+    example = torch.randn(1, 3, *model.visual.image_size, device=device, dtype=get_dtype(device))
+    example = example.to(memory_format=get_memory_format(device))
+
+    try:
+        with torch.no_grad():
+            _image_encoder = torch.jit.trace(model.visual, example, strict=False)
+    except Exception as e:
+        print(f"    ⚠️  Could not trace CLIP image encoder, using eager mode: {e}")
+        _image_encoder = model.encode_image
+
+    return _image_encoder
+
+
+def open_poster(image_path):
+    """Open an image as RGB, preferring its pre-sized CLIP copy when one exists."""
+    clip_path = clip_poster_path(image_path)
+    if os.path.exists(clip_path):
+        image_path = clip_path
+    return Image.open(image_path).convert('RGB')
+
+
+def warm_up():
+    """
+    Load the model and trace the image encoder ahead of the first job.
+    The ingest service is long-lived, so this is paid once per process start.
+    """
+    load_model()
+    load_image_encoder()
+
+
 def embed_image(image_path):
     """
     Generate CLIP embedding for an image.
     Returns a 512-dim numpy array.
     """
-    model, preprocess, _, device = load_model()
+    _, preprocess, _, device = load_model()
+    encoder = load_image_encoder()
 
-    image = Image.open(image_path).convert('RGB')
-    image_tensor = preprocess(image).unsqueeze(0).to(device)
+    image = open_poster(image_path)
+    image_tensor = preprocess(image).unsqueeze(0).to(
+        device, dtype=get_dtype(device), memory_format=get_memory_format(device)
+    )
 
-    with torch.no_grad():
-        embedding = model.encode_image(image_tensor)
+    with torch.inference_mode():
+        embedding = encoder(image_tensor).float()
         embedding = embedding / embedding.norm(dim=-1, keepdim=True)
 
     return embedding.squeeze().cpu().numpy()
 
 
+def get_loader_pool():
+    """
+    Get the poster decoding thread pool, created once per process.
+    Threads rather than DataLoader worker processes: nothing is started per call,
+    and nothing forks while the writer and Whisper threads are running.
+    """
+    global _loader_pool
+    if _loader_pool is None:
+        _loader_pool = ThreadPoolExecutor(max_workers=LOADER_WORKERS, thread_name_prefix='clip-loader')
+    return _loader_pool
+
+
+def load_poster(image_path, preprocess):
+    """Decode and preprocess one poster (None if it can't be read)."""
+    try:
+        return preprocess(open_poster(image_path))
+    except Exception:
+        return None  # Unreadable image
+
+
+def collate_posters(items):
+    """
+    Stack decoded images into one batch tensor.
+    Returns (indices, batch, count) - batch is None if no image in the chunk was readable.
+    """
+    indices = [index for index, tensor in items if tensor is not None]
+    tensors = [tensor for _, tensor in items if tensor is not None]
+    batch = torch.stack(tensors) if tensors else None
+    return indices, batch, len(items)
+
+
+def embed_images(image_paths, batch_size=BATCH_SIZE, on_progress=None):
+    """
+    Generate CLIP embeddings for a list of images, batch_size at a time.
+    Returns a list of 512-dim numpy arrays aligned with image_paths
+    (None for images that could not be read).
+
+    Args:
+        image_paths: Paths to image files
+        batch_size: Number of images per encoder call
+        on_progress: Optional callback(images_done, total) after each batch
+    """
+    if not image_paths:
+        return []
+
+    _, preprocess, _, device = load_model()
+    encoder = load_image_encoder()
+
+    total = len(image_paths)
+    embeddings = [None] * total
+
+    pool = get_loader_pool()
+
+    def submit_batch(start):
+        return [
+            (index, pool.submit(load_poster, image_paths[index], preprocess))
+            for index in range(start, min(start + batch_size, total))
+        ]
+
+    done = 0
+    next_batch = submit_batch(0)
+    for start in range(0, total, batch_size):
+        # Decode the next batch while this one is encoded
+        futures, next_batch = next_batch, submit_batch(start + batch_size)
+        indices, batch, count = collate_posters([(index, future.result()) for index, future in futures])
+        if batch is not None:
+            batch = batch.to(device, dtype=get_dtype(device), memory_format=get_memory_format(device))
+            with torch.inference_mode():
+                batch_embeddings = F.normalize(encoder(batch).float(), dim=-1)
+
+            # One device->host copy per batch, rows are already unit length
+            for i, embedding in zip(indices, batch_embeddings.cpu().numpy()):
+                embeddings[i] = embedding
+
+        done += count
+        if on_progress:
+            on_progress(done, total)
+
+    return embeddings
+
+
 def embed_text(text):
     """
     Generate CLIP embedding for text query.
@@ -77,67 +248,144 @@ def embed_text(text):
 
     tokens = tokenizer([text]).to(device)
 
-    with torch.no_grad():
-        embedding = model.encode_text(tokens)
+    with torch.inference_mode():
+        embedding = model.encode_text(tokens).float()
         embedding = embedding / embedding.norm(dim=-1, keepdim=True)
 
     return embedding.squeeze().cpu().numpy()
 
 
+def upsert_embeddings(cur, rows):
+    """UPSERT embedding rows in one statement: insert or update if model already exists for a scene."""
+    execute_values(
+        cur,
+        """
+        INSERT INTO embeddings (scene_id, model_name, model_version, dimension, embedding)
+        VALUES %s
+        ON CONFLICT (scene_id, model_name) 
+        DO UPDATE SET model_version = EXCLUDED.model_version,
+                      dimension = EXCLUDED.dimension,
+                      embedding = EXCLUDED.embedding,
+                      created_at = NOW()
+        """,
+        rows,
+        page_size=WRITE_BATCH_SIZE
+    )
+
+
+class EmbeddingWriter:
+    """
+    Writes embedding rows on a background thread with its own connection.
+    Rows are upserted in chunks of WRITE_BATCH_SIZE and committed once on close().
+    """
+
+    def __init__(self):
+        self.queue = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+        self.error = None
+        self.thread = threading.Thread(target=self._drain, daemon=True)
+        self.thread.start()
+
+    def put(self, rows):
+        """Queue rows for writing (blocks if the writer is WRITE_QUEUE_SIZE chunks behind)."""
+        if rows:
+            self.queue.put(rows)
+
+    def close(self):
+        """Flush remaining rows, commit, and wait for the writer. Re-raises any write error."""
+        self.queue.put(None)
+        self.thread.join()
+        if self.error:
+            raise self.error
+
+    def _drain(self):
+        conn = get_connection()
+        cur = conn.cursor()
+        pending = []
+        done = False
+        try:
+            while not done:
+                rows = self.queue.get()
+                done = rows is None
+                if rows:
+                    pending.extend(rows)
+                if pending and (done or len(pending) >= WRITE_BATCH_SIZE):
+                    upsert_embeddings(cur, pending)
+                    pending = []
+            conn.commit()
+        except Exception as e:
+            self.error = e
+            conn.rollback()
+            while not done:
+                done = self.queue.get() is None  # Keep draining so put() never blocks
+        finally:
+            cur.close()
+            conn.close()
+
+
 def embed_scenes_for_file(file_id):
     """
     Generate CLIP embeddings for all scenes of a file.
     Writes to embeddings table with model/version/dimension.
     Returns number of scenes embedded.
     """
+    return embed_scenes_for_files([file_id])
+
+
+def embed_scenes_for_files(file_ids):
+    """
+    Generate CLIP embeddings for all scenes of several files at once.
+    Uses one anti-join for all files and shares encoder batches across them.
+    Returns number of scenes embedded.
+    """
     conn = get_connection()
-    cur = conn.cursor()
+
+    # Stream scenes through a server-side cursor so encoding starts after the
+    # first chunk instead of after materializing every row
+    scenes_cur = conn.cursor(name='clip_scenes')
+    scenes_cur.itersize = STREAM_SIZE
     
     # Get scenes with poster frames that don't have CLIP embedding yet
-    cur.execute("""
+    scenes_cur.execute("""
         SELECT s.id, s.poster_frame_path 
         FROM scenes s
         LEFT JOIN embeddings e ON s.id = e.scene_id AND e.model_name = %s
-        WHERE s.file_id = %s 
+        WHERE s.file_id = ANY(%s) 
         AND s.poster_frame_path IS NOT NULL
         AND e.id IS NULL
-    """, (MODEL_NAME, file_id))
-    
-    scenes = cur.fetchall()
-    
-    if not scenes:
-        cur.close()
-        conn.close()
-        return 0
-    
-    total = len(scenes)
+        ORDER BY s.file_id, s.scene_index
+    """, (MODEL_NAME, list(file_ids)))
+
     _, _, _, device = load_model()
     device_label = str(device).upper()
+    total = 0
 
-    for i, (scene_id, poster_path) in enumerate(scenes, 1):
-        progress_counter(i, total, f"CLIP embedding ({device_label})")
-        try:
-            embedding = embed_image(poster_path)
-            embedding_list = embedding.tolist()
-            # UPSERT: insert or update if model already exists for this scene
-            cur.execute(
-                """
-                INSERT INTO embeddings (scene_id, model_name, model_version, dimension, embedding)
-                VALUES (%s, %s, %s, %s, %s)
-                ON CONFLICT (scene_id, model_name) 
-                DO UPDATE SET model_version = EXCLUDED.model_version,
-                              dimension = EXCLUDED.dimension,
-                              embedding = EXCLUDED.embedding,
-                              created_at = NOW()
-                """,
-                (scene_id, MODEL_NAME, MODEL_VERSION, MODEL_DIMENSION, embedding_list)
-            )
-        except Exception as e:
-            pass  # Skip failed embeddings silently
-    
-    conn.commit()
-    cur.close()
-    conn.close()
+    # DB writes happen on a background thread so encoding never waits on them
+    writer = EmbeddingWriter()
+    try:
+        while True:
+            scenes = scenes_cur.fetchmany(STREAM_SIZE)
+            if not scenes:
+                break
+
+            def on_progress(done, _):
+                progress_counter(total + done, None, f"CLIP embedding ({device_label})", every=BATCH_SIZE)
+
+            # Encode posters in batches rather than one forward pass per scene
+            embeddings = embed_images([poster_path for _, poster_path in scenes], on_progress=on_progress)
+
+            writer.put([
+                (scene_id, MODEL_NAME, MODEL_VERSION, MODEL_DIMENSION, embedding)
+                for (scene_id, _), embedding in zip(scenes, embeddings)
+                if embedding is not None  # Skip failed embeddings silently
+            ])
+            total += len(scenes)
+    finally:
+        scenes_cur.close()
+        conn.close()
+        writer.close()
+
+    if total == 0:
+        return 0
     
     progress_done(f"Embedded {total} scenes")
     return total
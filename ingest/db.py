@@ -3,11 +3,32 @@ Database connection and operations for the ingest service.
 """
 
 import os
+from contextlib import contextmanager
+import numpy as np
 import psycopg2
+from psycopg2.extensions import register_adapter, adapt
+from psycopg2.pool import ThreadedConnectionPool
 
-def get_connection():
-    """Get a connection to the Postgres database."""
-    return psycopg2.connect(
+# Shared pool for short, frequent statements (lazily created).
+# Sized for the concurrent ffprobe workers, which each borrow one for probe_cache.
+_pool = None
+POOL_MAX_CONNECTIONS = 32
+
+
+# Adapter for numpy arrays -> pgvector text literal ('[0.1,0.2,...]').
+# Parsed directly by vector_in, instead of a numeric ARRAY[...] that has to be cast.
+# 9 significant digits round-trip a float4 exactly, in about half the text of a float64
+# repr (0.100000001 vs 0.10000000149011612), and format in one % operation.
+def adapt_numpy_array(arr):
+    values = arr.tolist()
+    return adapt('[' + ','.join(['%.9g'] * len(values)) % tuple(values) + ']')
+
+register_adapter(np.ndarray, adapt_numpy_array)
+
+
+def get_connection_params():
+    """Get Postgres connection parameters from the environment."""
+    return dict(
         host=os.environ.get("DB_HOST", "localhost"),
         port=os.environ.get("DB_PORT", "5432"),
         database=os.environ.get("DB_NAME", "fennec"),
@@ -15,7 +36,82 @@ def get_connection():
         password=os.environ.get("DB_PASSWORD", "fennec"),
     )
 
+
+def get_connection():
+    """Get a connection to the Postgres database."""
+    return psycopg2.connect(**get_connection_params())
+
+
+def get_pool():
+    """Get the shared connection pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        _pool = ThreadedConnectionPool(1, POOL_MAX_CONNECTIONS, **get_connection_params())
+    return _pool
+
+
+@contextmanager
+def connection():
+    """
+    Borrow a pooled connection instead of opening a new one.
+    Commits on success, rolls back on error, and returns it to the pool.
+    """
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        if not conn.closed:
+            conn.rollback()
+        raise
+    finally:
+        pool.putconn(conn, close=bool(conn.closed))
+
+
 def init_db():
     """Initialize database schema if needed."""
     # Schema is created by init.sql, this is for any runtime migrations
-    pass
+    # (databases created before these were added to init.sql)
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_enrichment_queue_pending
+                ON enrichment_queue (queued_at) WHERE status = 'pending'
+            """)
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_faces_scene
+                ON faces (scene_id)
+            """)
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_files_path_pattern
+                ON files (path text_pattern_ops)
+            """)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS probe_cache (
+                    fingerprint TEXT PRIMARY KEY,
+                    metadata JSONB,
+                    created_at TIMESTAMP DEFAULT NOW()
+                )
+            """)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS scan_directories (
+                    path TEXT PRIMARY KEY,
+                    mtime DOUBLE PRECISION,
+                    subdirs TEXT[],
+                    videos TEXT[]
+                )
+            """)
+            # Store ArcFace embeddings as fp16 (halfvec needs pgvector >= 0.7)
+            cur.execute("""
+                SELECT format_type(atttypid, atttypmod) FROM pg_attribute
+                WHERE attrelid = 'faces'::regclass AND attname = 'embedding'
+            """)
+            row = cur.fetchone()
+            if row and row[0] == 'vector(512)':
+                cur.execute("SELECT 1 FROM pg_type WHERE typname = 'halfvec'")
+                if cur.fetchone():
+                    cur.execute("""
+                        ALTER TABLE faces ALTER COLUMN embedding TYPE halfvec(512)
+                        USING embedding::halfvec(512)
+                    """)
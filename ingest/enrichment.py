@@ -7,13 +7,41 @@ to keep scans instant. If FFprobe fails, the job is marked as failed.
 """
 
 import os
-from db import get_connection
-from scene_detect import detect_scenes
-from clip_embed import embed_scenes_for_file
-from whisper_transcribe import transcribe_video
-from transcript_embed import embed_transcripts_for_file
-from face_detect import detect_faces_for_file
-from scanner import get_config, get_video_metadata, get_watch_folders
+import queue
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from db import connection
+from scene_detect import detect_scenes, find_scenes_worker, save_scenes, get_scene_timing, get_poster_settings
+from clip_embed import embed_scenes_for_file, warm_up as warm_up_clip
+from whisper_transcribe import transcribe_video, load_model as load_whisper_model
+from transcript_embed import embed_transcripts_for_file, load_model as load_transcript_model
+from face_detect import detect_faces_for_file, load_model as load_face_model
+from scanner import get_config, get_video_metadata_cached, get_watch_folders, folder_prefixes
+
+# Background worker for stages that can overlap with CLIP (see process_file)
+_stage_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='enrichment-stage')
+
+# Concurrent ffprobe runs when probing a batch of pending files up front.
+# ffprobe is an external process, so this scales past the GIL (override with PROBE_WORKERS)
+PROBE_WORKERS = int(os.environ.get('PROBE_WORKERS', min(32, (os.cpu_count() or 2) * 2)))
+
+# Scene detection decodes every frame on the CPU, so it runs in processes, one per core
+# up to 8 (override with SCENE_WORKERS; 1 disables the up-front batch)
+SCENE_WORKERS = int(os.environ.get('SCENE_WORKERS', min(8, os.cpu_count() or 1)))
+
+# File ids whose scenes were already saved by detect_pending_scenes in this batch
+_scenes_ready = set()
+
+# Scene detection processes, kept across batches: each spawned child re-imports the
+# service (torch, CLIP, Whisper...), which can cost more than a batch's detection
+_scene_pool = None
+
+# Worker processes for enrichment_workers > 1, kept across batches so each one
+# loads its models once instead of once per run_enrichment call
+_worker_pool = None
+_worker_pool_key = None
 
 
 def get_enabled_models():
@@ -24,90 +52,70 @@ def get_enabled_models():
 
 def get_pending_jobs(limit=10):
     """Get pending enrichment jobs."""
-    conn = get_connection()
-    cur = conn.cursor()
-    
-    cur.execute("""
-        SELECT eq.id, eq.file_id, f.path
-        FROM enrichment_queue eq
-        JOIN files f ON f.id = eq.file_id
-        WHERE eq.status = 'pending'
-        ORDER BY eq.queued_at
-        LIMIT %s
-    """, (limit,))
-    
-    jobs = cur.fetchall()
-    cur.close()
-    conn.close()
-    
-    return jobs
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT eq.id, eq.file_id, f.path
+                FROM enrichment_queue eq
+                JOIN files f ON f.id = eq.file_id
+                WHERE eq.status = 'pending'
+                ORDER BY eq.queued_at
+                LIMIT %s
+            """, (limit,))
+            return cur.fetchall()
 
 
 def mark_job_processing(job_id, total_stages):
     """Mark a job as processing with total stage count."""
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        UPDATE enrichment_queue 
-        SET status = 'processing', started_at = NOW(),
-            current_stage = 'starting', current_stage_num = 0, total_stages = %s
-        WHERE id = %s
-    """, (total_stages, job_id))
-    conn.commit()
-    cur.close()
-    conn.close()
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                UPDATE enrichment_queue 
+                SET status = 'processing', started_at = NOW(),
+                    current_stage = 'starting', current_stage_num = 0, total_stages = %s
+                WHERE id = %s
+            """, (total_stages, job_id))
 
 
 def update_job_stage(job_id, stage_name, stage_num):
     """Update the current stage of a processing job."""
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        UPDATE enrichment_queue 
-        SET current_stage = %s, current_stage_num = %s
-        WHERE id = %s
-    """, (stage_name, stage_num, job_id))
-    conn.commit()
-    cur.close()
-    conn.close()
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                UPDATE enrichment_queue 
+                SET current_stage = %s, current_stage_num = %s
+                WHERE id = %s
+            """, (stage_name, stage_num, job_id))
 
 
 def mark_job_complete(job_id):
     """Mark a job as complete and update file indexed_at."""
-    conn = get_connection()
-    cur = conn.cursor()
-    
-    # Mark queue job complete
-    cur.execute("""
-        UPDATE enrichment_queue 
-        SET status = 'complete', completed_at = NOW()
-        WHERE id = %s
-    """, (job_id,))
-    
-    # Update file's indexed_at timestamp
-    cur.execute("""
-        UPDATE files 
-        SET indexed_at = NOW()
-        WHERE id = (SELECT file_id FROM enrichment_queue WHERE id = %s)
-    """, (job_id,))
-    
-    conn.commit()
-    cur.close()
-    conn.close()
+    with connection() as conn:
+        with conn.cursor() as cur:
+            # Mark queue job complete and update file's indexed_at in one statement
+            cur.execute("""
+                WITH q AS (
+                    UPDATE enrichment_queue 
+                    SET status = 'complete', completed_at = NOW()
+                    WHERE id = %s
+                    RETURNING file_id
+                )
+                UPDATE files 
+                SET indexed_at = NOW()
+                FROM q
+                WHERE files.id = q.file_id
+            """, (job_id,))
 
 
 def mark_job_failed(job_id, error):
     """Mark a job as failed."""
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        UPDATE enrichment_queue 
-        SET status = 'failed', error = %s, retry_count = retry_count + 1
-        WHERE id = %s
-    """, (error, job_id))
-    conn.commit()
-    cur.close()
-    conn.close()
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                UPDATE enrichment_queue 
+                SET status = 'failed', error = %s, retry_count = retry_count + 1
+                WHERE id = %s
+            """, (error, job_id))
 
 
 def get_total_stages(models):
@@ -128,75 +136,163 @@ def extract_metadata_if_needed(file_id, video_path):
 
     Returns True if metadata is valid, False if file is unreadable.
     """
-    conn = get_connection()
-    cur = conn.cursor()
-
     # Check if we already have metadata
-    cur.execute("SELECT duration_seconds FROM files WHERE id = %s", (file_id,))
-    row = cur.fetchone()
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT duration_seconds FROM files WHERE id = %s", (file_id,))
+            row = cur.fetchone()
 
     if row and row[0] is not None:
         # Already have duration, metadata was extracted during scan
-        cur.close()
-        conn.close()
         return True
 
-    # Extract metadata with FFprobe
+    # Extract metadata with FFprobe, or from probe_cache if this content was probed before
+    # (without holding a pooled connection)
     print(f"    Extracting video metadata...")
-    video_meta = get_video_metadata(video_path)
+    video_meta = get_video_metadata_cached(video_path)
 
     # Check if FFprobe succeeded
     if video_meta['duration_seconds'] is None:
-        cur.close()
-        conn.close()
         return False  # Unreadable file
 
     # Update file record with metadata
-    cur.execute("""
-        UPDATE files SET
-            duration_seconds = %s,
-            width = %s,
-            height = %s,
-            fps = %s,
-            codec = %s,
-            audio_tracks = %s,
-            pix_fmt = %s,
-            color_space = %s,
-            color_transfer = %s,
-            color_primaries = %s
-        WHERE id = %s
-    """, (
-        video_meta['duration_seconds'],
-        video_meta['width'],
-        video_meta['height'],
-        video_meta['fps'],
-        video_meta['codec'],
-        video_meta['audio_tracks'],
-        video_meta['pix_fmt'],
-        video_meta['color_space'],
-        video_meta['color_transfer'],
-        video_meta['color_primaries'],
-        file_id
-    ))
-
-    conn.commit()
-    cur.close()
-    conn.close()
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                UPDATE files SET
+                    duration_seconds = %s,
+                    width = %s,
+                    height = %s,
+                    fps = %s,
+                    codec = %s,
+                    audio_tracks = %s,
+                    pix_fmt = %s,
+                    color_space = %s,
+                    color_transfer = %s,
+                    color_primaries = %s
+                WHERE id = %s
+            """, (
+                video_meta['duration_seconds'],
+                video_meta['width'],
+                video_meta['height'],
+                video_meta['fps'],
+                video_meta['codec'],
+                video_meta['audio_tracks'],
+                video_meta['pix_fmt'],
+                video_meta['color_space'],
+                video_meta['color_transfer'],
+                video_meta['color_primaries'],
+                file_id
+            ))
 
     return True
 
 
-def process_file(file_id, video_path, job_id=None):
+def probe_pending_files(files):
+    """
+    Run the metadata stage for a batch of (file_id, video_path) up front, PROBE_WORKERS
+    ffprobe processes at a time, instead of one file at a time as each job starts.
+    Failures are left for require_metadata to report when the job runs.
+    """
+    def probe(file):
+        try:
+            extract_metadata_if_needed(*file)
+        except Exception as e:
+            print(f"    ⚠️  Could not probe {file[1]}: {e}")
+
+    with ThreadPoolExecutor(max_workers=max(1, min(PROBE_WORKERS, len(files)))) as pool:
+        list(pool.map(probe, files))
+
+
+def get_scene_pool():
+    """Get the long-lived scene detection pool (SCENE_WORKERS processes), creating it on first use."""
+    global _scene_pool
+    if _scene_pool is None:
+        # spawn (not fork) so workers don't inherit torch/MPS state from this process
+        _scene_pool = ProcessPoolExecutor(
+            max_workers=SCENE_WORKERS, mp_context=multiprocessing.get_context('spawn')
+        )
+    return _scene_pool
+
+
+def detect_pending_scenes(jobs, total_stages):
+    """
+    Run scene detection for a batch of (job_id, file_id, video_path) up front,
+    SCENE_WORKERS processes at a time, instead of one file at a time inside each job.
+    Jobs are marked processing (at the scene detection stage) first, so the batch shows
+    as in progress while it runs.
+    Workers only decode and write posters; scenes are saved here, in this process.
+    Failures are left for the job's own scene detection stage to retry and report.
+    """
+    global _scene_pool
+    settings = get_poster_settings()
+    detector = get_config('scene_detector', 'pyscenedetect')
+
+    for job_id, _, _ in jobs:
+        mark_job_processing(job_id, total_stages)
+        update_job_stage(job_id, 'scene_detection', 2)  # After metadata, as in process_file
+
+    pool = get_scene_pool()
+    futures = {}
+    for _, file_id, video_path in jobs:
+        try:
+            fps, duration = get_scene_timing(file_id, video_path)
+        except Exception as e:
+            print(f"    ⚠️  Could not read timing for {video_path}: {e}")
+            continue
+        future = pool.submit(find_scenes_worker, file_id, video_path, fps, duration, settings, detector)
+        futures[future] = video_path
+
+    for future in as_completed(futures):
+        video_path = futures[future]
+        try:
+            file_id, scenes = future.result()
+            save_scenes(file_id, scenes)
+        except BrokenProcessPool as e:
+            # A worker died (e.g. OOM); release the broken pool and start fresh next batch
+            if _scene_pool is pool:
+                pool.shutdown(wait=False, cancel_futures=True)
+                _scene_pool = None
+            print(f"    ⚠️  Could not detect scenes for {video_path}: {e}")
+            continue
+        except Exception as e:
+            print(f"    ⚠️  Could not detect scenes for {video_path}: {e}")
+            continue
+        _scenes_ready.add(file_id)
+        print(f"    ✓ {len(scenes)} scenes detected: {os.path.basename(video_path)}")
+
+
+def run_scene_detection(file_id, video_path):
+    """Detect scenes for a file, unless detect_pending_scenes already did."""
+    if file_id in _scenes_ready:
+        _scenes_ready.discard(file_id)
+        return
+    detect_scenes(video_path, file_id)
+
+
+def require_metadata(file_id, video_path):
+    """Extract metadata if needed, raising ValueError if the file is unreadable."""
+    if not extract_metadata_if_needed(file_id, video_path):
+        raise ValueError(f"FFprobe failed - file may be corrupted or unsupported format")
+
+
+def process_file(file_id, video_path, job_id=None, models=None, parallel_stages=None):
     """
     Run all enrichment steps on a video file.
     Respects model toggles from config.
 
+    models / parallel_stages are read from config when not given;
+    run_enrichment passes them in so config is read once per batch, not per file.
+
     Raises ValueError if metadata extraction fails (unreadable file).
     """
     filename = os.path.basename(video_path)
     print(f"\n  📁 {filename}")
 
-    models = get_enabled_models()
+    if models is None:
+        models = get_enabled_models()
+    if parallel_stages is None:
+        parallel_stages = get_config('parallel_stages', True)
     step = 0
     total_steps = get_total_stages(models)
 
@@ -206,23 +302,33 @@ def process_file(file_id, video_path, job_id=None):
     if job_id:
         update_job_stage(job_id, 'metadata', step)
 
-    if not extract_metadata_if_needed(file_id, video_path):
-        raise ValueError(f"FFprobe failed - file may be corrupted or unsupported format")
+    require_metadata(file_id, video_path)
 
     # Step 2: Scene detection (always runs)
     step += 1
     print(f"    [{step}/{total_steps}] Scene detection")
     if job_id:
         update_job_stage(job_id, 'scene_detection', step)
-    detect_scenes(video_path, file_id)
+    run_scene_detection(file_id, video_path)
     
+    # Whisper (FFmpeg audio decode + CPU) and CLIP (GPU matmul) don't contend for
+    # the same resources, so transcribe in the background while CLIP runs
+    whisper_future = None
+    if models.get('whisper', True) and parallel_stages:
+        whisper_future = _stage_executor.submit(transcribe_video, video_path, file_id)
+
     # Step 3: CLIP embeddings for each scene
     if models.get('clip', True):
         step += 1
         print(f"    [{step}/{total_steps}] CLIP embeddings")
         if job_id:
             update_job_stage(job_id, 'clip', step)
-        embed_scenes_for_file(file_id)
+        try:
+            embed_scenes_for_file(file_id)
+        except Exception:
+            if whisper_future:
+                whisper_future.exception()  # Let transcription finish before failing the job
+            raise
 
     # Step 4: Whisper transcription
     if models.get('whisper', True):
@@ -230,7 +336,10 @@ def process_file(file_id, video_path, job_id=None):
         print(f"    [{step}/{total_steps}] Whisper transcription")
         if job_id:
             update_job_stage(job_id, 'whisper', step)
-        transcribe_video(video_path, file_id)
+        if whisper_future:
+            whisper_future.result()
+        else:
+            transcribe_video(video_path, file_id)
 
     # Step 5: Transcript embeddings (semantic search)
     if models.get('transcript_embed', True):
@@ -262,46 +371,231 @@ def get_accessible_watch_folders():
 
 def is_in_accessible_folder(video_path, accessible_folders):
     """Check if a video path is under an accessible watch folder."""
-    return any(video_path.startswith(folder) for folder in accessible_folders)
+    return video_path.startswith(folder_prefixes(accessible_folders))
+
+
+def get_pipeline_stages(models):
+    """
+    Get the enrichment stages for the enabled models, in order.
+    Returns list of (stage_name, label, fn(file_id, video_path)).
+    """
+    stages = [
+        ('metadata', 'Metadata extraction', require_metadata),
+        ('scene_detection', 'Scene detection', run_scene_detection),
+    ]
+    if models.get('clip', True):
+        stages.append(('clip', 'CLIP embeddings', lambda file_id, _: embed_scenes_for_file(file_id)))
+    if models.get('whisper', True):
+        stages.append(('whisper', 'Whisper transcription', lambda file_id, video_path: transcribe_video(video_path, file_id)))
+    if models.get('transcript_embed', True):
+        stages.append(('transcript_embed', 'Transcript embeddings', lambda file_id, _: embed_transcripts_for_file(file_id)))
+    if models.get('arcface', True):
+        stages.append(('arcface', 'Face detection', lambda file_id, _: detect_faces_for_file(file_id)))
+    return stages
+
+
+def run_pipelined(jobs, models):
+    """
+    Run enrichment as a pipeline across files: each stage has its own thread fed
+    by a small bounded queue, so Whisper can transcribe file A while CLIP embeds
+    file B and scene detection works on file C.
+
+    Args:
+        jobs: List of (job_id, file_id, video_path)
+        models: Enabled models dict
+
+    Returns number of files enriched successfully.
+    """
+    stages = get_pipeline_stages(models)
+    total_stages = len(stages)
+    queues = [queue.Queue(maxsize=2) for _ in stages]
+    completed = []
+
+    def stage_worker(index, stage_name, label, fn):
+        inbox = queues[index]
+        outbox = queues[index + 1] if index + 1 < total_stages else None
+
+        job = ...
+        try:
+            while True:
+                job = inbox.get()
+                if job is None:
+                    return
+
+                job_id, file_id, video_path = job
+                # Bookkeeping is inside the try too: a DB error here must not kill the
+                # thread, or the upstream put() blocks forever on the bounded queue
+                try:
+                    print(f"    [{index + 1}/{total_stages}] {label}: {os.path.basename(video_path)}")
+                    update_job_stage(job_id, stage_name, index + 1)
+                    fn(file_id, video_path)
+                except Exception as e:
+                    print(f"    ❌ Error: {e}")
+                    try:
+                        mark_job_failed(job_id, str(e))
+                    except Exception as mark_error:
+                        print(f"    ⚠️  Could not mark job failed: {mark_error}")
+                    continue
+
+                if outbox:
+                    outbox.put(job)
+                    continue
+
+                try:
+                    mark_job_complete(job_id)
+                    completed.append(job_id)
+                    print(f"  ✅ Done: {os.path.basename(video_path)}")
+                except Exception as e:
+                    print(f"    ⚠️  Could not mark job complete: {e}")
+        finally:
+            # If this thread died early, keep consuming so upstream put() can't block
+            while job is not None:
+                job = inbox.get()
+            # Always pass the sentinel on so downstream stages (and join()) finish
+            if outbox:
+                outbox.put(None)
+
+    threads = [
+        threading.Thread(target=stage_worker, args=(i, *stage), name=f"enrichment-{stage[0]}")
+        for i, stage in enumerate(stages)
+    ]
+    for thread in threads:
+        thread.start()
+
+    for job_id, file_id, video_path in jobs:
+        mark_job_processing(job_id, total_stages)
+        queues[0].put((job_id, file_id, video_path))
+    queues[0].put(None)
+
+    for thread in threads:
+        thread.join()
+
+    return len(completed)
+
+
+def find_existing_files(paths):
+    """
+    Return the subset of paths that exist. Each stat is a round trip on NFS/SMB,
+    so the batch's paths are checked concurrently rather than one after another.
+    """
+    paths = list(paths)
+    if len(paths) <= 1:
+        return {path for path in paths if os.path.exists(path)}
+
+    with ThreadPoolExecutor(max_workers=min(PROBE_WORKERS, len(paths))) as pool:
+        return {path for path, exists in zip(paths, pool.map(os.path.exists, paths)) if exists}
+
+
+def preload_models(models):
+    """Worker process initializer: load the enabled models before the first job."""
+    if models.get('clip', True):
+        warm_up_clip()
+    if models.get('whisper', True):
+        load_whisper_model()
+    if models.get('transcript_embed', True):
+        load_transcript_model()
+    if models.get('arcface', True):
+        load_face_model()
+
+
+def get_worker_pool(workers, models):
+    """
+    Get the long-lived enrichment worker pool, (re)creating it only when the worker
+    count or enabled models changed.
+    """
+    global _worker_pool, _worker_pool_key
+    key = (workers, tuple(sorted(models.items())))
+    if _worker_pool is None or _worker_pool_key != key:
+        if _worker_pool is not None:
+            _worker_pool.shutdown()
+        # spawn (not fork) so workers don't inherit torch/MPS state from this process
+        _worker_pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=preload_models,
+            initargs=(models,)
+        )
+        _worker_pool_key = key
+    return _worker_pool
+
+
+def run_job(job_id, file_id, video_path, total_stages, models, parallel_stages):
+    """
+    Process one enrichment job and record its outcome in the queue.
+    Returns True if the file was enriched successfully.
+    """
+    mark_job_processing(job_id, total_stages)
+
+    try:
+        process_file(file_id, video_path, job_id, models, parallel_stages)
+        mark_job_complete(job_id)
+        return True
+    except Exception as e:
+        print(f"    ❌ Error: {e}")
+        mark_job_failed(job_id, str(e))
+        return False
 
 
 def run_enrichment():
     """Process all pending enrichment jobs."""
+    global _worker_pool
     jobs = get_pending_jobs()
 
     if not jobs:
         return 0
 
+    # Read config once for the whole batch
     models = get_enabled_models()
+    parallel_stages = get_config('parallel_stages', True)
+    workers = get_config('enrichment_workers', 1)
+    pipeline = get_config('pipeline_stages', False)
     total_stages = get_total_stages(models)
 
     # Determine which watch folders are accessible
     accessible_folders = get_accessible_watch_folders()
 
-    processed = 0
-    skipped_unmounted = 0
-    for job_id, file_id, video_path in jobs:
-        # Check if file's watch folder is accessible
-        if not is_in_accessible_folder(video_path, accessible_folders):
-            # Watch folder is unmounted - skip without marking failed
-            skipped_unmounted += 1
-            continue
+    # Check if each file's watch folder is accessible
+    prefixes = folder_prefixes(accessible_folders)
+    mounted = [job for job in jobs if job[2].startswith(prefixes)]
+    # Watch folder is unmounted - skip without marking failed
+    skipped_unmounted = len(jobs) - len(mounted)
+    existing = find_existing_files(video_path for _, _, video_path in mounted)
 
+    runnable = []
+    for job_id, file_id, video_path in mounted:
         # Watch folder is accessible but file is missing - this is a real problem
-        if not os.path.exists(video_path):
+        if video_path not in existing:
             print(f"    ⚠️  File not found: {video_path}")
             mark_job_failed(job_id, "File not found")
             continue
 
-        mark_job_processing(job_id, total_stages)
-        
+        runnable.append((job_id, file_id, video_path, total_stages, models, parallel_stages))
+
+    # ffprobe is a subprocess, so the whole batch can be probed concurrently
+    if len(runnable) > 1:
+        probe_pending_files([(file_id, video_path) for _, file_id, video_path, *_ in runnable])
+
+    # Worker processes already enrich files side by side, and the pipeline overlaps
+    # scene detection with the other stages; otherwise detect scenes for the whole
+    # batch in parallel before the serial jobs run
+    if workers <= 1 and not pipeline and SCENE_WORKERS > 1 and len(runnable) > 1:
+        detect_pending_scenes([job[:3] for job in runnable], total_stages)
+
+    if workers > 1 and len(runnable) > 1:
+        # Enrich several files at once; each worker process keeps its own models loaded
+        pool = get_worker_pool(workers, models)
         try:
-            process_file(file_id, video_path, job_id)
-            mark_job_complete(job_id)
-            processed += 1
-        except Exception as e:
-            print(f"    ❌ Error: {e}")
-            mark_job_failed(job_id, str(e))
+            processed = sum(pool.map(run_job, *zip(*runnable)))
+        except BrokenProcessPool:
+            _worker_pool = None  # A worker died (e.g. OOM); start fresh next batch
+            raise
+    elif pipeline and len(runnable) > 1:
+        # Overlap different stages of consecutive files in one process
+        processed = run_pipelined([job[:3] for job in runnable], models)
+    else:
+        processed = sum(run_job(*job) for job in runnable)
+
+    _scenes_ready.clear()  # Jobs that failed before scene detection
 
     if skipped_unmounted > 0:
         print(f"  ⏸️  Skipped {skipped_unmounted} files in unmounted watch folders")
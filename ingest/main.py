@@ -5,10 +5,14 @@ Uses simple polling (not watchdog) for NFS/SMB compatibility.
 """
 
 import os
+import select
+import sys
 import time
-from db import get_connection
+import psycopg2
+from db import get_connection, init_db
 from scanner import run_scan, get_stats, get_indexer_state, get_poll_interval, recover_stuck_jobs, set_config, get_config
-from enrichment import run_enrichment
+from enrichment import run_enrichment, get_enabled_models
+from clip_embed import warm_up as warm_up_clip
 
 
 def format_duration(seconds):
@@ -62,7 +66,87 @@ def sync_watch_folders_from_env():
         print(f"✓ Watch folders from env: {', '.join(folders)}")
 
 
+# While the LISTEN connection is down, re-read indexer_state this often
+LISTEN_RETRY_SECONDS = 10
+
+
+def listen_for_state_changes():
+    """
+    Open a dedicated connection LISTENing on the indexer_state channel.
+    The server NOTIFYs this channel whenever indexer_state is changed from the UI.
+    """
+    conn = get_connection()
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute("LISTEN indexer_state")
+    cur.close()
+    return conn
+
+
+def reopen_listener():
+    """Open a new LISTEN connection, or return None if the database isn't reachable yet."""
+    try:
+        return listen_for_state_changes()
+    except psycopg2.Error as e:
+        print(f"⚠️  Could not reconnect state listener: {e}")
+        return None
+
+
+def wait_for_state_change(listen_conn, state, timeout):
+    """
+    Sleep up to timeout seconds, returning early if indexer_state changes.
+    Blocks on the LISTEN socket instead of polling the config table.
+    If the listener connection is lost (e.g. Postgres restarted) it is reopened; until then
+    the config is re-read every LISTEN_RETRY_SECONDS instead.
+    Returns (new state or None if the timeout elapsed without a change, listener connection).
+    """
+    deadline = time.time() + timeout
+    while True:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return None, listen_conn
+
+        if listen_conn is None:
+            # No listener: timed re-read of the config, then try to reconnect.
+            # (A change made while it was down was never NOTIFYed to us.)
+            time.sleep(min(remaining, LISTEN_RETRY_SECONDS))
+            try:
+                new_state = get_indexer_state()
+            except psycopg2.Error:
+                continue  # Database still down
+            if new_state != state:
+                return new_state, listen_conn
+            listen_conn = reopen_listener()
+            continue
+
+        try:
+            ready, _, _ = select.select([listen_conn], [], [], remaining)
+            if not ready:
+                return None, listen_conn
+            listen_conn.poll()
+        except (psycopg2.Error, OSError, ValueError) as e:
+            print(f"⚠️  State listener lost ({e}); reconnecting")
+            try:
+                listen_conn.close()
+            except psycopg2.Error:
+                pass
+            listen_conn = None  # Re-read state (NOTIFYs may have been missed), then reconnect
+            continue
+
+        if listen_conn.notifies:
+            listen_conn.notifies.clear()
+            try:
+                new_state = get_indexer_state()
+            except psycopg2.Error:
+                continue
+            if new_state != state:
+                return new_state, listen_conn
+
+
 def main():
+    # One write per line instead of per print/flush (PYTHONUNBUFFERED makes stdout raw)
+    sys.stdout.reconfigure(line_buffering=True)
+    
     print("🦊 Fennec Ingest Service starting...")
     
     # Test database connection
@@ -74,6 +158,13 @@ def main():
     cur.close()
     conn.close()
     
+    # Apply runtime migrations (indexes added after initial schema)
+    init_db()
+    
+    # Keep CLIP warm in this long-lived process so the first job doesn't pay load + trace
+    if get_enabled_models().get('clip', True):
+        warm_up_clip()
+    
     # Sync watch folders from environment variable
     sync_watch_folders_from_env()
     
@@ -82,18 +173,24 @@ def main():
     if recovered > 0:
         print(f"↻ Recovered {recovered} stuck job(s) from previous run")
     
+    # Wake the sleep loop on indexer_state changes instead of polling for them
+    listen_conn = listen_for_state_changes()
+    
+    # Stats scan every table; only recompute them after a pass that changed the index
+    stats_stale = True
+    
     # Main polling loop
     while True:
         state = get_indexer_state()
         
         if state == 'paused':
             print("⏸️  Indexer paused. Waiting...")
-            time.sleep(30)
+            _, listen_conn = wait_for_state_change(listen_conn, state, 30)
             continue
         
         # Run scan
         print("\n🔍 Scanning watch folders...")
-        total, new, updated, skipped = run_scan()
+        total, new, updated, skipped, deleted = run_scan()
         status_parts = [f"Found {total} videos"]
         if new > 0:
             status_parts.append(f"{new} new")
@@ -101,7 +198,11 @@ def main():
             status_parts.append(f"{updated} modified")
         if skipped > 0:
             status_parts.append(f"{skipped} skipped")
+        if deleted > 0:
+            status_parts.append(f"{deleted} deleted")
         print(f"✓ Scan complete. {', '.join(status_parts)}.")
+        if new > 0 or updated > 0 or deleted > 0:
+            stats_stale = True
         
         # Get pending count
         conn = get_connection()
@@ -116,23 +217,22 @@ def main():
             print(f"\n⚙️  Processing {pending} pending files...")
             processed = run_enrichment()
             print(f"✓ Enrichment complete. Processed {processed} files.")
+            # Failed jobs change the queue counts too, not just completed ones
+            stats_stale = True
         
-        # Print stats
-        print_stats()
+        # Print stats (skipped on idle passes)
+        if stats_stale:
+            print_stats()
+            stats_stale = False
         
         # Wait for next poll
         poll_interval = get_poll_interval()
         print(f"\n💤 Next scan in {format_duration(poll_interval)}... (Ctrl+C to stop)")
         
-        # Sleep in small increments so we can respond to state changes
-        sleep_start = time.time()
-        while time.time() - sleep_start < poll_interval:
-            # Check if state changed (e.g. paused -> running)
-            new_state = get_indexer_state()
-            if new_state != state:
-                print(f"   State changed to: {new_state}")
-                break
-            time.sleep(10)
+        # Sleep until the next poll, waking early if state changes (e.g. running -> paused)
+        new_state, listen_conn = wait_for_state_change(listen_conn, state, poll_interval)
+        if new_state is not None:
+            print(f"   State changed to: {new_state}")
 
 
 if __name__ == "__main__":
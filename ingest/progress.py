@@ -2,12 +2,18 @@
 Simple progress indicators for long-running operations.
 Docker logs don't handle carriage returns well, so we use
 periodic newline-based updates instead.
+Output relies on line-buffered stdout (set in main.py) rather than per-print flushes.
 """
 
 import sys
 import threading
 import time
 
+# Minimum seconds between progress_counter lines (first and last are always shown)
+PROGRESS_INTERVAL = 2.0
+
+_last_progress_at = 0.0
+
 
 class Spinner:
     """Simple spinner that prints dots periodically."""
@@ -18,13 +24,13 @@ class Spinner:
         self.thread = None
     
     def _spin(self):
-        print(f"    ⏳ {self.message}...", flush=True)
+        print(f"    ⏳ {self.message}...")
         dots = 0
         while self.running:
             time.sleep(5)  # Print a dot every 5 seconds
             if self.running:
                 dots += 1
-                print(f"       ...still working ({dots * 5}s)", flush=True)
+                print(f"       ...still working ({dots * 5}s)")
     
     def start(self):
         self.running = True
@@ -36,20 +42,27 @@ class Spinner:
         if self.thread:
             self.thread.join()
         if final_message:
-            print(f"    ✓ {final_message}", flush=True)
+            print(f"    ✓ {final_message}")
         else:
-            print(f"    ✓ {self.message} - done", flush=True)
+            print(f"    ✓ {self.message} - done")
 
 
 def progress_counter(current, total, message, every=10):
     """
-    Show progress counter every N items.
+    Show progress counter every N items, at most once per PROGRESS_INTERVAL.
     Prints: [10/155] Message, [20/155] Message, etc.
+    Pass total=None when the total isn't known up front (prints [10] Message).
     """
-    if current == 1 or current == total or current % every == 0:
-        print(f"    [{current}/{total}] {message}", flush=True)
+    global _last_progress_at
+    now = time.monotonic()
+    if current == 1 or current == total or (
+        current % every == 0 and now - _last_progress_at >= PROGRESS_INTERVAL
+    ):
+        _last_progress_at = now
+        counter = f"{current}/{total}" if total is not None else f"{current}"
+        print(f"    [{counter}] {message}")
 
 
 def progress_done(message):
     """Show completion message."""
-    print(f"    ✓ {message}", flush=True)
+    print(f"    ✓ {message}")
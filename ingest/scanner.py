@@ -5,16 +5,29 @@ Uses polling (no watchdog) for NFS/SMB compatibility.
 
 Performance notes:
 - Uses os.scandir() instead of os.walk() for faster directory traversal
+- Lists directories concurrently so network share round trips overlap
+  (iterative work list, no recursion - deep trees can't hit the recursion limit)
 - FFprobe metadata extraction is deferred to enrichment phase for instant scans
+  (and runs in-process via PyAV when it is installed, see av_probe.py)
 - Progress is written to DB for Reports UI visibility
 """
 
 import os
 import subprocess
 import json
+import hashlib
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
-from db import get_connection
+from psycopg2.extras import execute_values
+from db import connection
+
+try:
+    import av_probe  # In-process probing when PyAV is installed (see get_video_metadata)
+except ImportError:
+    av_probe = None
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -25,6 +38,16 @@ logging.basicConfig(
 )
 
 
+# Directory listings kept in flight while scanning (hides NFS/SMB latency).
+# Raise SCAN_WORKERS for high-latency mounts, lower it for spinning local disks.
+SCAN_WORKERS = int(os.environ.get('SCAN_WORKERS', '16'))
+
+# Files looked up / written per batch in run_scan
+SCAN_BATCH_SIZE = 2000
+
+# Bytes hashed (with size + mtime) to fingerprint a file for probe_cache
+PROBE_FINGERPRINT_BYTES = 64 * 1024
+
 # Supported video extensions
 # Only formats FFmpeg can fully decode (not just demux)
 # Excludes: R3D (RED), BRAW (Blackmagic), ARI (ARRI) - require proprietary SDKs
@@ -51,32 +74,70 @@ def get_video_extensions():
     return VIDEO_EXTENSIONS
 
 
-def get_config(key, default=None):
-    """Get a config value from the database."""
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT value FROM config WHERE key = %s", (key,))
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
-    
-    if row is None:
-        return default
-    return row[0]
+# Seconds a loaded copy of the config table is reused before re-reading it
+CONFIG_CACHE_TTL = 30.0
+
+_config_cache = {}
+_config_loaded_at = None
+
+
+def load_all_config(max_age=CONFIG_CACHE_TTL):
+    """
+    Get every config value as a dict, read with one query and reused for max_age seconds.
+    Pass max_age=0 to force a fresh read.
+    """
+    global _config_cache, _config_loaded_at
+
+    now = time.monotonic()
+    if _config_loaded_at is None or now - _config_loaded_at >= max_age:
+        with connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT key, value FROM config")
+                _config_cache = dict(cur.fetchall())
+        _config_loaded_at = now
+    return _config_cache
+
+
+def get_config(key, default=None, max_age=CONFIG_CACHE_TTL):
+    """
+    Get a config value (from the cached config table, see load_all_config).
+    Pass max_age=0 for values another process may just have changed.
+    """
+    return load_all_config(max_age).get(key, default)
 
 
 def set_config(key, value):
-    """Set a config value in the database."""
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO config (key, value) 
-        VALUES (%s, %s)
-        ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value
-    """, (key, json.dumps(value)))
-    conn.commit()
-    cur.close()
-    conn.close()
+    """Set a config value in the database (and in this process's config cache)."""
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO config (key, value) 
+                VALUES (%s, %s)
+                ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value
+            """, (key, json.dumps(value)))
+    _config_cache[key] = value
+
+
+def folder_prefixes(folders):
+    """
+    Path prefixes for a list of folders, as a tuple for a single str.startswith() call.
+    Each ends in a separator so /media/a doesn't match files under /media/ab.
+    """
+    return tuple(folder if folder.endswith(os.sep) else folder + os.sep for folder in folders)
+
+
+def folder_path_filter(folders):
+    """
+    SQL condition on files.path (and its params) matching files under any of folders.
+    One LIKE per folder, so the planner can use idx_files_path_pattern (text_pattern_ops).
+    """
+    patterns = [
+        prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        for prefix in folder_prefixes(folders)
+    ]
+    if not patterns:
+        return 'FALSE', []
+    return '(' + ' OR '.join(['path LIKE %s'] * len(patterns)) + ')', patterns
 
 
 def get_watch_folders():
@@ -85,8 +146,8 @@ def get_watch_folders():
 
 
 def get_indexer_state():
-    """Get current indexer state (running/paused)."""
-    return get_config('indexer_state', 'running')
+    """Get current indexer state (running/paused). Always read fresh (set from the UI)."""
+    return get_config('indexer_state', 'running', max_age=0)
 
 
 def get_poll_interval():
@@ -96,12 +157,38 @@ def get_poll_interval():
 
 # ============ Scan Progress Tracking ============
 
+# Minimum seconds between scan_progress writes within the same phase
+SCAN_PROGRESS_INTERVAL = 0.5
+
+_last_progress_phase = None
+_last_progress_at = 0.0
+
+# Latest throttled tick, written by a timer at the end of the interval
+_pending_progress = None
+_progress_timer = None
+_progress_lock = threading.Lock()
+
+
+def _flush_scan_progress():
+    """Write the held-back progress tick (runs on the throttle timer)."""
+    global _pending_progress, _progress_timer, _last_progress_at
+    with _progress_lock:
+        progress, _pending_progress, _progress_timer = _pending_progress, None, None
+        if progress is not None:
+            _last_progress_at = time.monotonic()
+            set_config('scan_progress', progress)
+
+
 def update_scan_progress(phase, current_folder=None, dirs_scanned=0, files_found=0,
                          files_processed=0, files_new=0, files_updated=0, files_skipped=0):
     """
     Update scan progress in config table for UI visibility.
     This allows the Reports page to show what the scanner is doing.
+    Writes at most once per SCAN_PROGRESS_INTERVAL within a phase; the latest
+    throttled tick is written when the interval ends, so the UI never stays stale.
     """
+    global _last_progress_phase, _last_progress_at, _pending_progress, _progress_timer
+
     progress = {
         'phase': phase,  # 'discovering', 'processing', 'checking_missing', 'complete', 'idle'
         'current_folder': current_folder,
@@ -113,7 +200,25 @@ def update_scan_progress(phase, current_folder=None, dirs_scanned=0, files_found
         'files_skipped': files_skipped,
         'updated_at': datetime.now().isoformat()
     }
-    set_config('scan_progress', progress)
+
+    with _progress_lock:
+        # Same-phase ticks are throttled; a phase change (incl. complete/idle) is always written
+        now = time.monotonic()
+        if phase == _last_progress_phase and now - _last_progress_at < SCAN_PROGRESS_INTERVAL:
+            _pending_progress = progress
+            if _progress_timer is None:
+                _progress_timer = threading.Timer(
+                    SCAN_PROGRESS_INTERVAL - (now - _last_progress_at), _flush_scan_progress
+                )
+                _progress_timer.daemon = True
+                _progress_timer.start()
+            return
+
+        # This write supersedes anything held back
+        _pending_progress = None
+        _last_progress_phase = phase
+        _last_progress_at = now
+        set_config('scan_progress', progress)
 
 
 def clear_scan_progress():
@@ -123,26 +228,36 @@ def clear_scan_progress():
 
 def get_scan_progress():
     """Get current scan progress."""
-    return get_config('scan_progress', {'phase': 'idle'})
+    return get_config('scan_progress', {'phase': 'idle'}, max_age=0)
 
 
 def is_video_file(path):
     """Check if a file is a video based on extension."""
-    _, ext = os.path.splitext(path)
-    return ext.lower() in get_video_extensions()
+    # Same suffix test as scan_directory's inline check (no splitext allocations)
+    name = path[path.rfind(os.sep) + 1:]
+    dot = name.rfind('.')
+    return dot > 0 and name[dot:].lower() in VIDEO_EXTENSIONS
 
 
 def get_video_metadata(video_path):
     """
-    Extract video metadata using FFprobe.
+    Extract video metadata using FFprobe (one process for video, audio and format info).
+    With PyAV installed the file is probed in-process instead, falling back to
+    FFprobe for anything PyAV can't read.
     Returns dict with: duration, width, height, fps, codec, audio_tracks, color info
     """
+    if av_probe is not None:
+        try:
+            return av_probe.probe(video_path)
+        except Exception:
+            pass  # FFprobe below reports the error if it can't read it either
+    
     cmd = [
         'ffprobe', '-v', 'error',
-        '-select_streams', 'v:0',
-        '-show_entries', 'stream=width,height,r_frame_rate,codec_name,pix_fmt,color_space,color_transfer,color_primaries',
+        '-show_entries', 'stream=index,codec_type,width,height,r_frame_rate,codec_name,pix_fmt,color_space,color_transfer,color_primaries',
         '-show_entries', 'format=duration',
-        '-of', 'json',
+        '-of', 'json=compact=1',
+        '-threads', '1',  # Metadata only, no decoder thread pool
         video_path
     ]
     
@@ -160,16 +275,20 @@ def get_video_metadata(video_path):
     }
     
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+        # Compact JSON, parsed straight from bytes (no separate decode step)
+        result = subprocess.run(cmd, capture_output=True, timeout=30)
         data = json.loads(result.stdout)
         
         # Get format-level info
         if 'format' in data and 'duration' in data['format']:
             metadata['duration_seconds'] = float(data['format']['duration'])
         
-        # Get stream info
-        if 'streams' in data and len(data['streams']) > 0:
-            stream = data['streams'][0]
+        streams = data.get('streams', [])
+        video_streams = [s for s in streams if s.get('codec_type') == 'video']
+        
+        # Get stream info (first video stream)
+        if video_streams:
+            stream = video_streams[0]
             metadata['width'] = stream.get('width')
             metadata['height'] = stream.get('height')
             metadata['codec'] = stream.get('codec_name')
@@ -189,16 +308,7 @@ def get_video_metadata(video_path):
             metadata['color_primaries'] = stream.get('color_primaries')
         
         # Count audio tracks
-        audio_cmd = [
-            'ffprobe', '-v', 'error',
-            '-select_streams', 'a',
-            '-show_entries', 'stream=index',
-            '-of', 'csv=p=0',
-            video_path
-        ]
-        audio_result = subprocess.run(audio_cmd, capture_output=True, text=True, timeout=30)
-        if audio_result.stdout.strip():
-            metadata['audio_tracks'] = len(audio_result.stdout.strip().split('\n'))
+        metadata['audio_tracks'] = sum(1 for s in streams if s.get('codec_type') == 'audio')
             
     except Exception as e:
         print(f"    ⚠️  Could not extract metadata: {e}")
@@ -206,9 +316,60 @@ def get_video_metadata(video_path):
     return metadata
 
 
-def get_file_metadata(filepath):
+def get_content_fingerprint(video_path, stat=None):
+    """
+    Fingerprint a file by size, mtime and a hash of its first PROBE_FINGERPRINT_BYTES.
+    Unchanged by renames/moves, so probe results can be reused for a moved file.
+    Returns None if the file can't be read.
+    """
+    try:
+        if stat is None:
+            stat = os.stat(video_path)
+        with open(video_path, 'rb') as f:
+            head = f.read(PROBE_FINGERPRINT_BYTES)
+    except OSError:
+        return None
+    digest = hashlib.blake2b(head, digest_size=16).hexdigest()
+    return f"{stat.st_size}:{stat.st_mtime_ns}:{digest}"
+
+
+def get_video_metadata_cached(video_path, stat=None):
+    """
+    get_video_metadata, reusing results stored in probe_cache under the file's
+    content fingerprint. Only successful probes (with a duration) are cached.
+    Pass stat to reuse an os.stat() result the caller already has.
+    """
+    fingerprint = get_content_fingerprint(video_path, stat)
+    if fingerprint is None:
+        return get_video_metadata(video_path)
+
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT metadata FROM probe_cache WHERE fingerprint = %s", (fingerprint,))
+            row = cur.fetchone()
+
+    if row is not None:
+        return row[0]
+
+    metadata = get_video_metadata(video_path)
+    if metadata['duration_seconds'] is None:
+        return metadata
+
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO probe_cache (fingerprint, metadata, created_at)
+                VALUES (%s, %s, NOW())
+                ON CONFLICT (fingerprint) DO UPDATE SET metadata = EXCLUDED.metadata
+            """, (fingerprint, json.dumps(metadata)))
+
+    return metadata
+
+
+def get_file_metadata(filepath, stat=None):
     """
     Extract filesystem metadata.
+    Pass stat to reuse an os.stat() result the caller already has.
     Returns dict with: file_size_bytes, file_created_at, file_modified_at, parent_folder
     """
     metadata = {
@@ -219,15 +380,19 @@ def get_file_metadata(filepath):
     }
     
     try:
-        stat = os.stat(filepath)
+        if stat is None:
+            stat = os.stat(filepath)
         metadata['file_size_bytes'] = stat.st_size
+        # Naive local times, matching the TIMESTAMP columns and the values they're compared to
         metadata['file_modified_at'] = datetime.fromtimestamp(stat.st_mtime)
         
         # st_birthtime is macOS, st_ctime is creation on Windows, modified on Linux
-        if hasattr(stat, 'st_birthtime'):
-            metadata['file_created_at'] = datetime.fromtimestamp(stat.st_birthtime)
+        created = getattr(stat, 'st_birthtime', stat.st_ctime)
+        if created == stat.st_mtime:
+            # Usual for files that were never renamed or chmodded (no second conversion)
+            metadata['file_created_at'] = metadata['file_modified_at']
         else:
-            metadata['file_created_at'] = datetime.fromtimestamp(stat.st_ctime)
+            metadata['file_created_at'] = datetime.fromtimestamp(created)
         
         # Parent folder name (just the immediate directory)
         metadata['parent_folder'] = os.path.basename(os.path.dirname(filepath))
@@ -238,14 +403,92 @@ def get_file_metadata(filepath):
     return metadata
 
 
-def scan_folder(folder_path, on_progress=None):
+def is_file_changed(current_mtime, current_size, db_mtime, db_size, indexed_at):
+    """Check if an indexed file has been modified since last indexing (mtime or size)."""
+    # Use both mtime and size for faster detection
+    if indexed_at is None or current_mtime is None or db_mtime is None:
+        return False
+    # Compare timestamps (allow 1 second tolerance for filesystem precision)
+    if current_mtime > db_mtime and (current_mtime - db_mtime).total_seconds() > 1:
+        return True
+    # Also check size - quick way to detect changes
+    return current_size is not None and db_size is not None and current_size != db_size
+
+
+def stat_file(filepath):
+    """os.stat a file, or None if it can't be accessed."""
+    try:
+        return os.stat(filepath)
+    except Exception as e:
+        logger.warning(f"Cannot stat file {filepath}: {e}")
+        return None
+
+
+def scan_directory(path, cached=None, file_stats=None):
+    """
+    List one directory with os.scandir.
+    If cached (mtime, subdirs, videos) is given and the directory's mtime still matches,
+    the cached listing is returned without reading the directory.
+    If file_stats is given, each video's DirEntry lstat result is stored in it by path.
+    Returns (mtime, subdirectory paths, video file paths), or None if it can't be read.
+    """
+    # Hot loop: bind lookups to locals and check the extension inline
+    # (same test as is_video_file, without splitext or a call per entry)
+    video_exts = VIDEO_EXTENSIONS
+    subdirs = []
+    videos = []
+    subdirs_append = subdirs.append
+    videos_append = videos.append
+
+    try:
+        mtime = None
+        if cached is not None:
+            # Adding/removing/renaming an entry bumps the directory's mtime
+            mtime = os.stat(path).st_mtime
+            if mtime == cached[0]:
+                return cached
+
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    # Classify by name first so most entries need a single type check:
+                    # only names with a video suffix are tested as files, the rest as dirs.
+                    # Both checks use the d_type cached on the DirEntry (lstat only on
+                    # DT_UNKNOWN) and don't follow symlinks; FIFOs/sockets/links are skipped
+                    name = entry.name
+                    dot = name.rfind('.')
+                    if dot > 0 and name[dot:].lower() in video_exts and entry.is_file(follow_symlinks=False):
+                        videos_append(entry.path)
+                        if file_stats is not None:
+                            # Already cached on the DirEntry when is_file() had to lstat
+                            file_stats[entry.path] = entry.stat(follow_symlinks=False)
+                    elif entry.is_dir(follow_symlinks=False):
+                        subdirs_append(entry.path)
+                except (PermissionError, OSError):
+                    continue
+    except (PermissionError, OSError) as e:
+        logger.debug(f"Cannot access {path}: {e}")
+        return None
+
+    return mtime, subdirs, videos
+
+
+def scan_folder(folder_path, on_progress=None, dir_cache=None, file_stats=None, failed_dirs=None):
     """
     Scan a folder recursively for video files using os.scandir (faster than os.walk).
+    Keeps up to SCAN_WORKERS directory listings in flight, so NFS/SMB round trips overlap
+    instead of adding up one directory at a time.
     Returns tuple of (list of absolute paths, directories scanned count).
 
     Args:
         folder_path: Root folder to scan
         on_progress: Optional callback(dirs_scanned, current_dir) for progress updates
+        dir_cache: Optional dict of path -> (mtime, subdirs, videos) from a previous scan.
+                   Unchanged directories are not re-read; the dict is updated in place.
+        file_stats: Optional dict filled with path -> stat_result for videos in directories
+                    that were read (not for cached listings), for add_files_to_db.
+        failed_dirs: Optional list that directories whose listing failed are appended to.
+                     Their subtrees weren't scanned, so their videos are absent from the result.
     """
     videos = []
     dirs_scanned = 0
@@ -255,22 +498,28 @@ def scan_folder(folder_path, on_progress=None):
         logger.warning(f"Folder not found: {folder_path}")
         return videos, 0
 
-    def _scan_recursive(path):
-        nonlocal dirs_scanned
-        try:
-            with os.scandir(path) as entries:
+    def submit(pool, path):
+        # Any dict turns on mtime checks; a directory not seen before is a cache miss
+        cached = dir_cache.get(path, (None, [], [])) if dir_cache is not None else None
+        return pool.submit(scan_directory, path, cached, file_stats)
+
+    with ThreadPoolExecutor(max_workers=SCAN_WORKERS) as pool:
+        pending = {submit(pool, folder_path): folder_path}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = pending.pop(future)
+                result = future.result()
+                if result is None:
+                    if failed_dirs is not None:
+                        failed_dirs.append(path)
+                    continue
+
+                mtime, subdirs, found = result
+                if dir_cache is not None:
+                    dir_cache[path] = (mtime, subdirs, found)
                 dirs_scanned += 1
-                subdirs = []
-
-                for entry in entries:
-                    try:
-                        if entry.is_dir(follow_symlinks=False):
-                            subdirs.append(entry.path)
-                        elif entry.is_file(follow_symlinks=False):
-                            if is_video_file(entry.name):
-                                videos.append(entry.path)
-                    except (PermissionError, OSError):
-                        continue
+                videos.extend(found)
 
                 # Log progress every 100 directories
                 if dirs_scanned % 100 == 0:
@@ -278,19 +527,80 @@ def scan_folder(folder_path, on_progress=None):
                     if on_progress:
                         on_progress(dirs_scanned, path)
 
-                # Recurse into subdirectories
+                # Queue subdirectories (their own mtimes are checked separately)
                 for subdir in subdirs:
-                    _scan_recursive(subdir)
-
-        except (PermissionError, OSError) as e:
-            logger.debug(f"Cannot access {path}: {e}")
+                    pending[submit(pool, subdir)] = subdir
 
-    _scan_recursive(folder_path)
+    # Listings complete out of order; keep results stable between scans
+    videos.sort()
     logger.info(f"Scan complete: {dirs_scanned} directories, {len(videos)} videos found")
 
     return videos, dirs_scanned
 
 
+def load_directory_cache(folders):
+    """Load cached directory listings under the given folders: path -> (mtime, subdirs, videos)."""
+    in_folders, params = folder_path_filter(folders)
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT path, mtime, subdirs, videos FROM scan_directories WHERE path = ANY(%s) OR " + in_folders,
+                [list(folders), *params]
+            )
+            cache = {path: (mtime, subdirs, videos) for path, mtime, subdirs, videos in cur.fetchall()}
+    return cache
+
+
+def save_directory_cache(cache, previous):
+    """UPSERT directory listings that changed since previous (as loaded by load_directory_cache)."""
+    rows = [
+        (path, mtime, subdirs, videos)
+        for path, (mtime, subdirs, videos) in cache.items()
+        if previous.get(path) != (mtime, subdirs, videos)
+    ]
+    if not rows:
+        return
+
+    with connection() as conn:
+        with conn.cursor() as cur:
+            execute_values(
+                cur,
+                """
+                INSERT INTO scan_directories (path, mtime, subdirs, videos)
+                VALUES %s
+                ON CONFLICT (path) DO UPDATE SET mtime = EXCLUDED.mtime,
+                                                 subdirs = EXCLUDED.subdirs,
+                                                 videos = EXCLUDED.videos
+                """,
+                rows,
+                template="(%s, %s, %s::text[], %s::text[])",
+                page_size=SCAN_BATCH_SIZE
+            )
+
+
+# Tail of a "WITH upd AS (UPDATE files ... RETURNING id" statement: clears the updated
+# files' scenes and queue entries and queues them again. The DELETE and INSERT see the
+# same snapshot, so the new queue row isn't deleted.
+REQUEUE_UPDATED = """
+    ), cleared_scenes AS (
+        DELETE FROM scenes WHERE file_id IN (SELECT id FROM upd)
+    ), cleared_queue AS (
+        DELETE FROM enrichment_queue WHERE file_id IN (SELECT id FROM upd)
+    )
+    INSERT INTO enrichment_queue (file_id, status, queued_at)
+    SELECT id, 'pending', NOW() FROM upd
+"""
+
+# Tail of a "WITH ins AS (INSERT INTO files ... RETURNING id" statement: queues the new file
+QUEUE_INSERTED = """
+    ), queued AS (
+        INSERT INTO enrichment_queue (file_id, status, queued_at)
+        SELECT id, 'pending', NOW() FROM ins
+    )
+    SELECT id FROM ins
+"""
+
+
 def add_file_to_db(filepath, defer_probe=True):
     """
     Add a video file to the database if it doesn't exist,
@@ -303,61 +613,262 @@ def add_file_to_db(filepath, defer_probe=True):
 
     Returns (file_id, is_new, was_updated).
     """
-    conn = get_connection()
-    cur = conn.cursor()
-
-    # Get current file's modified time and size (fast - no FFprobe)
-    current_mtime = None
-    current_size = None
-    try:
-        stat = os.stat(filepath)
-        current_mtime = datetime.fromtimestamp(stat.st_mtime)
-        current_size = stat.st_size
-    except Exception as e:
-        logger.warning(f"Cannot stat file {filepath}: {e}")
-        cur.close()
-        conn.close()
+    # Get current file's modified time and size (fast - no FFprobe), before borrowing a connection
+    stat = stat_file(filepath)
+    if stat is None:
         return None, False, False
+    current_mtime = datetime.fromtimestamp(stat.st_mtime)
+    current_size = stat.st_size
+
+    with connection() as conn:
+        with conn.cursor() as cur:
+            # Check if file already exists (an unchanged file needs nothing beyond this SELECT)
+            cur.execute("SELECT id, deleted_at, file_modified_at, file_size_bytes, indexed_at FROM files WHERE path = %s", (filepath,))
+            existing = cur.fetchone()
+
+            if existing:
+                file_id, deleted_at, db_mtime, db_size, indexed_at = existing
+
+                if deleted_at is not None:
+                    # File was soft-deleted but reappeared - resurrect it
+                    logger.info(f"Resurrecting previously deleted file: {filepath}")
+                    cur.execute("UPDATE files SET deleted_at = NULL WHERE id = %s", (file_id,))
+                    return file_id, True, False  # Treat as new for re-enrichment
+
+                # Check if file has been modified since last indexing
+                if is_file_changed(current_mtime, current_size, db_mtime, db_size, indexed_at):
+                    logger.info(f"File modified, re-queuing: {filepath}")
+                    # File was modified - update basic metadata and re-queue
+                    # FFprobe will run during enrichment if defer_probe=True
+
+                    # The update, clearing old enrichment data and re-queuing all run as
+                    # one statement (REQUEUE_UPDATED) instead of four round trips
+                    if defer_probe:
+                        # Just update file metadata, FFprobe runs during enrichment
+                        cur.execute("""
+                            WITH upd AS (
+                            UPDATE files SET
+                                file_modified_at = %s,
+                                file_size_bytes = %s,
+                                indexed_at = NULL,
+                                duration_seconds = NULL,
+                                width = NULL,
+                                height = NULL,
+                                fps = NULL,
+                                codec = NULL,
+                                audio_tracks = NULL
+                            WHERE id = %s
+                            RETURNING id
+                        """ + REQUEUE_UPDATED, (current_mtime, current_size, file_id))
+                    else:
+                        video_meta = get_video_metadata_cached(filepath, stat)
+                        cur.execute("""
+                            WITH upd AS (
+                            UPDATE files SET
+                                file_modified_at = %s,
+                                file_size_bytes = %s,
+                                duration_seconds = %s,
+                                width = %s,
+                                height = %s,
+                                fps = %s,
+                                codec = %s,
+                                audio_tracks = %s,
+                                indexed_at = NULL
+                            WHERE id = %s
+                            RETURNING id
+                        """ + REQUEUE_UPDATED, (
+                            current_mtime,
+                            current_size,
+                            video_meta['duration_seconds'],
+                            video_meta['width'],
+                            video_meta['height'],
+                            video_meta['fps'],
+                            video_meta['codec'],
+                            video_meta['audio_tracks'],
+                            file_id
+                        ))
+
+                    return file_id, False, True  # Existing file, was updated
+
+                return file_id, False, False
+
+            # New file - add to database
+            file_meta = get_file_metadata(filepath, stat)
+            filename = os.path.basename(filepath)
+
+            # Either insert queues the new file in the same statement (QUEUE_INSERTED)
+            if defer_probe:
+                # Insert with minimal metadata - FFprobe runs during enrichment
+                logger.debug(f"Adding new file (deferred probe): {filepath}")
+                cur.execute(
+                    """
+                    WITH ins AS (
+                    INSERT INTO files (
+                        path, filename,
+                        file_size_bytes, file_created_at, file_modified_at, parent_folder
+                    )
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                    RETURNING id
+                    """ + QUEUE_INSERTED,
+                    (
+                        filepath, filename,
+                        file_meta['file_size_bytes'], file_meta['file_created_at'],
+                        file_meta['file_modified_at'], file_meta['parent_folder']
+                    )
+                )
+            else:
+                # Immediate probe (legacy behavior)
+                video_meta = get_video_metadata_cached(filepath, stat)
+
+                # Validate: skip files FFprobe can't read (no duration = unreadable)
+                if video_meta['duration_seconds'] is None:
+                    logger.warning(f"FFprobe failed, skipping: {filepath}")
+                    return None, False, False  # Unreadable file, skip it
+
+                cur.execute(
+                    """
+                    WITH ins AS (
+                    INSERT INTO files (
+                        path, filename,
+                        duration_seconds, width, height, fps, codec, audio_tracks,
+                        file_size_bytes, file_created_at, file_modified_at, parent_folder,
+                        pix_fmt, color_space, color_transfer, color_primaries
+                    )
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    RETURNING id
+                    """ + QUEUE_INSERTED,
+                    (
+                        filepath, filename,
+                        video_meta['duration_seconds'], video_meta['width'], video_meta['height'],
+                        video_meta['fps'], video_meta['codec'], video_meta['audio_tracks'],
+                        file_meta['file_size_bytes'], file_meta['file_created_at'],
+                        file_meta['file_modified_at'], file_meta['parent_folder'],
+                        video_meta['pix_fmt'], video_meta['color_space'],
+                        video_meta['color_transfer'], video_meta['color_primaries']
+                    )
+                )
+
+            file_id = cur.fetchone()[0]
+
+    return file_id, True, False  # New file
 
-    # Check if file already exists
-    cur.execute("SELECT id, deleted_at, file_modified_at, file_size_bytes, indexed_at FROM files WHERE path = %s", (filepath,))
-    existing = cur.fetchone()
-
-    if existing:
-        file_id, deleted_at, db_mtime, db_size, indexed_at = existing
-
-        if deleted_at is not None:
-            # File was soft-deleted but reappeared - resurrect it
-            logger.info(f"Resurrecting previously deleted file: {filepath}")
-            cur.execute("UPDATE files SET deleted_at = NULL WHERE id = %s", (file_id,))
-            conn.commit()
-            cur.close()
-            conn.close()
-            return file_id, True, False  # Treat as new for re-enrichment
-
-        # Check if file has been modified since last indexing
-        # Use both mtime and size for faster detection
-        file_changed = False
-        if indexed_at is not None and current_mtime is not None and db_mtime is not None:
-            # Compare timestamps (allow 1 second tolerance for filesystem precision)
-            if current_mtime > db_mtime and (current_mtime - db_mtime).total_seconds() > 1:
-                file_changed = True
-            # Also check size - quick way to detect changes
-            if current_size is not None and db_size is not None and current_size != db_size:
-                file_changed = True
-
-        if file_changed:
-            logger.info(f"File modified, re-queuing: {filepath}")
-            # File was modified - update basic metadata and re-queue
-            # FFprobe will run during enrichment if defer_probe=True
-            file_meta = get_file_metadata(filepath)
 
-            if defer_probe:
-                # Just update file metadata, FFprobe runs during enrichment
+def load_indexed_files(folders=None):
+    """
+    Load the index state of known files in one query (only those under folders, if given).
+    Returns {path: (id, deleted_at, file_modified_at, file_size_bytes, indexed_at)},
+    the lookup add_files_to_db would otherwise do with a SELECT per batch.
+    """
+    query = """
+        SELECT path, id, deleted_at, file_modified_at, file_size_bytes, indexed_at
+        FROM files
+    """
+    params = None
+    if folders is not None:
+        # Rows for folders no longer watched can't match a discovered path
+        condition, params = folder_path_filter(folders)
+        query += " WHERE " + condition
+
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(query, params)
+            indexed = {row[0]: row[1:] for row in cur.fetchall()}
+    return indexed
+
+
+def add_files_to_db(filepaths, file_stats=None, assume_unchanged=None, indexed=None):
+    """
+    Batched add_file_to_db (deferred probe) for a list of paths.
+    Looks them all up with one SELECT, stats them on a thread pool (reusing stat results
+    from scan_folder's file_stats), and writes new / resurrected / modified files
+    with a few set-based statements in one transaction.
+
+    Paths in assume_unchanged that are already indexed (and not soft-deleted)
+    are reported unchanged without being stat-ed.
+
+    indexed is an optional preloaded load_indexed_files() result; when given,
+    the lookup is done in memory instead of with the SELECT, and rows written here
+    are recorded in it so later batches of the same scan see them.
+
+    Returns list of (file_id, is_new, was_updated) aligned with filepaths
+    (file_id is None for files that couldn't be accessed).
+    """
+    if not filepaths:
+        return []
+
+    with connection() as conn:
+        with conn.cursor() as cur:
+            if indexed is not None:
+                existing = {filepath: indexed[filepath] for filepath in filepaths if filepath in indexed}
+            else:
                 cur.execute("""
+                    SELECT path, id, deleted_at, file_modified_at, file_size_bytes, indexed_at
+                    FROM files WHERE path = ANY(%s)
+                """, (list(filepaths),))
+                existing = {row[0]: row[1:] for row in cur.fetchall()}
+
+            results = {}
+            if assume_unchanged:
+                for filepath in filepaths:
+                    row = existing.get(filepath)
+                    if row is not None and row[1] is None and filepath in assume_unchanged:
+                        results[filepath] = (row[0], False, False)
+
+            # Each path once (files.path is UNIQUE; a duplicate would be inserted twice)
+            to_check = [filepath for filepath in dict.fromkeys(filepaths) if filepath not in results]
+            file_stats = file_stats or {}
+            unstatted = [filepath for filepath in to_check if filepath not in file_stats]
+            if unstatted:
+                with ThreadPoolExecutor(max_workers=SCAN_WORKERS) as pool:
+                    file_stats = {**file_stats, **dict(zip(unstatted, pool.map(stat_file, unstatted)))}
+            stats = [file_stats[filepath] for filepath in to_check]
+
+            new_rows = []
+            resurrected_ids = []
+            modified_rows = []
+
+            for filepath, stat in zip(to_check, stats):
+                if stat is None:
+                    results[filepath] = (None, False, False)
+                    continue
+
+                if filepath not in existing:
+                    file_meta = get_file_metadata(filepath, stat)
+                    new_rows.append((
+                        filepath, os.path.basename(filepath),
+                        file_meta['file_size_bytes'], file_meta['file_created_at'],
+                        file_meta['file_modified_at'], file_meta['parent_folder']
+                    ))
+                    continue
+
+                file_id, deleted_at, db_mtime, db_size, indexed_at = existing[filepath]
+                current_mtime = datetime.fromtimestamp(stat.st_mtime)
+
+                if deleted_at is not None:
+                    # File was soft-deleted but reappeared - resurrect it
+                    logger.info(f"Resurrecting previously deleted file: {filepath}")
+                    resurrected_ids.append(file_id)
+                    results[filepath] = (file_id, True, False)  # Treat as new for re-enrichment
+                elif is_file_changed(current_mtime, stat.st_size, db_mtime, db_size, indexed_at):
+                    logger.info(f"File modified, re-queuing: {filepath}")
+                    modified_rows.append((file_id, current_mtime, stat.st_size))
+                    results[filepath] = (file_id, False, True)
+                else:
+                    results[filepath] = (file_id, False, False)
+
+            if resurrected_ids:
+                cur.execute("UPDATE files SET deleted_at = NULL WHERE id = ANY(%s)", (resurrected_ids,))
+
+            if modified_rows:
+                # Update basic metadata (FFprobe runs during enrichment), clear old
+                # enrichment data and re-queue, all in the same statement
+                execute_values(
+                    cur,
+                    """
+                    WITH upd AS (
                     UPDATE files SET
-                        file_modified_at = %s,
-                        file_size_bytes = %s,
+                        file_modified_at = v.file_modified_at,
+                        file_size_bytes = v.file_size_bytes,
                         indexed_at = NULL,
                         duration_seconds = NULL,
                         width = NULL,
@@ -365,124 +876,50 @@ def add_file_to_db(filepath, defer_probe=True):
                         fps = NULL,
                         codec = NULL,
                         audio_tracks = NULL
-                    WHERE id = %s
-                """, (file_meta['file_modified_at'], file_meta['file_size_bytes'], file_id))
-            else:
-                video_meta = get_video_metadata(filepath)
-                cur.execute("""
-                    UPDATE files SET
-                        file_modified_at = %s,
-                        file_size_bytes = %s,
-                        duration_seconds = %s,
-                        width = %s,
-                        height = %s,
-                        fps = %s,
-                        codec = %s,
-                        audio_tracks = %s,
-                        indexed_at = NULL
-                    WHERE id = %s
-                """, (
-                    file_meta['file_modified_at'],
-                    file_meta['file_size_bytes'],
-                    video_meta['duration_seconds'],
-                    video_meta['width'],
-                    video_meta['height'],
-                    video_meta['fps'],
-                    video_meta['codec'],
-                    video_meta['audio_tracks'],
-                    file_id
-                ))
-
-            # Clear old enrichment data
-            cur.execute("DELETE FROM scenes WHERE file_id = %s", (file_id,))
-
-            # Re-queue for enrichment (delete old entry if exists, then insert new)
-            cur.execute("DELETE FROM enrichment_queue WHERE file_id = %s", (file_id,))
-            cur.execute("""
-                INSERT INTO enrichment_queue (file_id, status, queued_at)
-                VALUES (%s, 'pending', NOW())
-            """, (file_id,))
-
-            conn.commit()
-            cur.close()
-            conn.close()
-            return file_id, False, True  # Existing file, was updated
-
-        cur.close()
-        conn.close()
-        return file_id, False, False
-
-    # New file - add to database
-    file_meta = get_file_metadata(filepath)
-    filename = os.path.basename(filepath)
-
-    if defer_probe:
-        # Insert with minimal metadata - FFprobe runs during enrichment
-        logger.debug(f"Adding new file (deferred probe): {filepath}")
-        cur.execute(
-            """
-            INSERT INTO files (
-                path, filename,
-                file_size_bytes, file_created_at, file_modified_at, parent_folder
-            )
-            VALUES (%s, %s, %s, %s, %s, %s)
-            RETURNING id
-            """,
-            (
-                filepath, filename,
-                file_meta['file_size_bytes'], file_meta['file_created_at'],
-                file_meta['file_modified_at'], file_meta['parent_folder']
-            )
-        )
-    else:
-        # Immediate probe (legacy behavior)
-        video_meta = get_video_metadata(filepath)
-
-        # Validate: skip files FFprobe can't read (no duration = unreadable)
-        if video_meta['duration_seconds'] is None:
-            logger.warning(f"FFprobe failed, skipping: {filepath}")
-            cur.close()
-            conn.close()
-            return None, False, False  # Unreadable file, skip it
-
-        cur.execute(
-            """
-            INSERT INTO files (
-                path, filename,
-                duration_seconds, width, height, fps, codec, audio_tracks,
-                file_size_bytes, file_created_at, file_modified_at, parent_folder,
-                pix_fmt, color_space, color_transfer, color_primaries
-            )
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            RETURNING id
-            """,
-            (
-                filepath, filename,
-                video_meta['duration_seconds'], video_meta['width'], video_meta['height'],
-                video_meta['fps'], video_meta['codec'], video_meta['audio_tracks'],
-                file_meta['file_size_bytes'], file_meta['file_created_at'],
-                file_meta['file_modified_at'], file_meta['parent_folder'],
-                video_meta['pix_fmt'], video_meta['color_space'],
-                video_meta['color_transfer'], video_meta['color_primaries']
-            )
-        )
-
-    file_id = cur.fetchone()[0]
-
-    # Add to enrichment queue
-    cur.execute(
-        """
-        INSERT INTO enrichment_queue (file_id, status, queued_at)
-        VALUES (%s, 'pending', NOW())
-        """,
-        (file_id,)
-    )
-
-    conn.commit()
-    cur.close()
-    conn.close()
-
-    return file_id, True, False  # New file
+                    FROM (VALUES %s) AS v (id, file_modified_at, file_size_bytes)
+                    WHERE files.id = v.id
+                    RETURNING files.id
+                    """ + REQUEUE_UPDATED,
+                    modified_rows,
+                    template="(%s, %s::timestamp, %s::bigint)",
+                    page_size=SCAN_BATCH_SIZE
+                )
+
+            if new_rows:
+                # Insert with minimal metadata - FFprobe runs during enrichment.
+                # The data-modifying CTE queues them in the same statement.
+                inserted = execute_values(
+                    cur,
+                    """
+                    WITH ins AS (
+                        INSERT INTO files (
+                            path, filename,
+                            file_size_bytes, file_created_at, file_modified_at, parent_folder
+                        )
+                        VALUES %s
+                        RETURNING path, id
+                    ), queued AS (
+                        INSERT INTO enrichment_queue (file_id, status, queued_at)
+                        SELECT id, 'pending', NOW() FROM ins
+                    )
+                    SELECT path, id FROM ins
+                    """,
+                    new_rows,
+                    page_size=SCAN_BATCH_SIZE,
+                    fetch=True
+                )
+                for filepath, file_id in inserted:
+                    results[filepath] = (file_id, True, False)
+
+            if indexed is not None:
+                for filepath, (file_id, is_new, was_updated) in results.items():
+                    if file_id is not None and (is_new or was_updated):
+                        stat = file_stats[filepath]
+                        indexed[filepath] = (
+                            file_id, None, datetime.fromtimestamp(stat.st_mtime), stat.st_size, None
+                        )
+
+    return [results[filepath] for filepath in filepaths]
 
 
 def recover_stuck_jobs(timeout_minutes=30):
@@ -491,36 +928,33 @@ def recover_stuck_jobs(timeout_minutes=30):
     This handles crashes/interruptions during enrichment.
     Returns number of recovered jobs.
     """
-    conn = get_connection()
-    cur = conn.cursor()
-    
-    cur.execute("""
-        UPDATE enrichment_queue
-        SET status = 'pending', started_at = NULL
-        WHERE status = 'processing'
-          AND started_at < NOW() - INTERVAL '%s minutes'
-        RETURNING id
-    """, (timeout_minutes,))
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                UPDATE enrichment_queue
+                SET status = 'pending', started_at = NULL
+                WHERE status = 'processing'
+                  AND started_at < NOW() - INTERVAL '%s minutes'
+                RETURNING id
+            """, (timeout_minutes,))
     
-    recovered = cur.rowcount
-    conn.commit()
-    cur.close()
-    conn.close()
+            recovered = cur.rowcount
     
     return recovered
 
 
-def mark_missing_files(watch_folders):
+def mark_missing_files(watch_folders, observed_paths=None, unlisted_dirs=None):
     """
     Mark files as deleted if they no longer exist on disk.
     Only checks files in watch folders that are currently accessible.
 
+    If observed_paths (the set of videos a scan of these folders just found) is given,
+    anything not in it is missing - no per-file stat needed. Files under unlisted_dirs
+    (directories the scan couldn't list, see scan_folder's failed_dirs) are left alone.
+
     Safety: If a watch folder itself is inaccessible (drive offline, unmounted),
     we skip checking files in that folder to prevent mass soft-deletes.
     """
-    conn = get_connection()
-    cur = conn.cursor()
-
     # First, determine which watch folders are actually accessible
     accessible_folders = []
     for folder in watch_folders:
@@ -531,41 +965,55 @@ def mark_missing_files(watch_folders):
 
     if not accessible_folders:
         logger.warning("No watch folders accessible - skipping missing file check")
-        cur.close()
-        conn.close()
         return 0
 
-    # Get all non-deleted files
-    cur.execute("""
-        SELECT id, path FROM files
-        WHERE deleted_at IS NULL
-    """)
-
-    deleted_count = 0
-    skipped_count = 0
-    for file_id, path in cur.fetchall():
-        # Check if this file is in an accessible watch folder
-        in_accessible = any(path.startswith(folder) for folder in accessible_folders)
-        if not in_accessible:
-            # File is in an inaccessible folder - skip it
-            skipped_count += 1
-            continue
-
-        # Check if file still exists
-        if not os.path.exists(path):
+    # Only fetch files in accessible watch folders (prefix match done by Postgres)
+    in_folders, params = folder_path_filter(accessible_folders)
+    with connection() as conn:
+        with conn.cursor() as cur:
             cur.execute(
-                "UPDATE files SET deleted_at = NOW() WHERE id = %s",
-                (file_id,)
+                "SELECT id, path FROM files WHERE deleted_at IS NULL AND " + in_folders,
+                params
             )
-            deleted_count += 1
+            candidates = cur.fetchall()
+
+            skipped_count = 0
+            if len(accessible_folders) < len(watch_folders):
+                cur.execute(
+                    "SELECT COUNT(*) FROM files WHERE deleted_at IS NULL AND NOT " + in_folders,
+                    params
+                )
+                skipped_count = cur.fetchone()[0]
+
+    if unlisted_dirs:
+        # A listing that failed (permissions, transient NFS/SMB error) says nothing about
+        # its files, and stat-ing them would fail the same way - skip that subtree
+        unlisted = folder_prefixes(unlisted_dirs)
+        candidates = [(file_id, path) for file_id, path in candidates if not path.startswith(unlisted)]
+
+    if observed_paths is not None:
+        # The fresh scan is authoritative for accessible folders
+        missing_ids = [file_id for file_id, path in candidates if path not in observed_paths]
+    else:
+        # Check if files still exist, many stats in flight at once (I/O bound on network shares).
+        # No connection is held meanwhile.
+        with ThreadPoolExecutor(max_workers=SCAN_WORKERS) as pool:
+            exists = pool.map(os.path.exists, [path for _, path in candidates])
+            missing_ids = [file_id for (file_id, _), found in zip(candidates, exists) if not found]
+
+    # Soft-delete all missing files in one statement
+    if missing_ids:
+        with connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "UPDATE files SET deleted_at = NOW() WHERE id = ANY(%s)",
+                    (missing_ids,)
+                )
+    deleted_count = len(missing_ids)
 
     if skipped_count > 0:
         logger.info(f"Skipped {skipped_count} files in inaccessible folders")
 
-    conn.commit()
-    cur.close()
-    conn.close()
-
     return deleted_count
 
 
@@ -574,51 +1022,42 @@ def get_stats():
     Get statistics for UI dashboard.
     Returns dict with counts and status info.
     """
-    conn = get_connection()
-    cur = conn.cursor()
-    
-    stats = {}
-    
-    # Total files
-    cur.execute("SELECT COUNT(*) FROM files WHERE deleted_at IS NULL")
-    stats['total_files'] = cur.fetchone()[0]
-    
-    # Total scenes
-    cur.execute("SELECT COUNT(*) FROM scenes")
-    stats['total_scenes'] = cur.fetchone()[0]
-    
-    # Total faces
-    cur.execute("SELECT COUNT(*) FROM faces")
-    stats['total_faces'] = cur.fetchone()[0]
-    
-    # Queue status
-    cur.execute("""
-        SELECT status, COUNT(*) 
-        FROM enrichment_queue 
-        GROUP BY status
-    """)
-    queue_status = dict(cur.fetchall())
-    stats['queue_pending'] = queue_status.get('pending', 0)
-    stats['queue_processing'] = queue_status.get('processing', 0)
-    stats['queue_complete'] = queue_status.get('complete', 0)
-    stats['queue_failed'] = queue_status.get('failed', 0)
-    
-    # Total video duration
-    cur.execute("SELECT COALESCE(SUM(duration_seconds), 0) FROM files WHERE deleted_at IS NULL")
-    stats['total_duration_seconds'] = cur.fetchone()[0]
-    
-    # Total storage used by videos
-    cur.execute("SELECT COALESCE(SUM(file_size_bytes), 0) FROM files WHERE deleted_at IS NULL")
-    stats['total_file_size_bytes'] = cur.fetchone()[0]
-    
-    # Last scan info
-    stats['last_scan_at'] = get_config('last_scan_at')
-    stats['last_scan_duration_ms'] = get_config('last_scan_duration_ms')
-    stats['indexer_state'] = get_config('indexer_state', 'running')
-    stats['poll_interval_seconds'] = get_config('poll_interval_seconds', 3600)
+    with connection() as conn:
+        with conn.cursor() as cur:
+            # All counts in one round trip (files aggregated in a single pass)
+            cur.execute("""
+                WITH f AS (
+                    SELECT COUNT(*) AS total_files,
+                           COALESCE(SUM(duration_seconds), 0) AS total_duration_seconds,
+                           COALESCE(SUM(file_size_bytes), 0) AS total_file_size_bytes
+                    FROM files WHERE deleted_at IS NULL
+                ),
+                q AS (
+                    SELECT COUNT(*) FILTER (WHERE status = 'pending') AS queue_pending,
+                           COUNT(*) FILTER (WHERE status = 'processing') AS queue_processing,
+                           COUNT(*) FILTER (WHERE status = 'complete') AS queue_complete,
+                           COUNT(*) FILTER (WHERE status = 'failed') AS queue_failed
+                    FROM enrichment_queue
+                )
+                SELECT f.total_files,
+                       (SELECT COUNT(*) FROM scenes) AS total_scenes,
+                       (SELECT COUNT(*) FROM faces) AS total_faces,
+                       q.queue_pending, q.queue_processing, q.queue_complete, q.queue_failed,
+                       f.total_duration_seconds, f.total_file_size_bytes,
+                       (SELECT value FROM config WHERE key = 'last_scan_at') AS last_scan_at,
+                       (SELECT value FROM config WHERE key = 'last_scan_duration_ms') AS last_scan_duration_ms,
+                       (SELECT value FROM config WHERE key = 'indexer_state') AS indexer_state,
+                       (SELECT value FROM config WHERE key = 'poll_interval_seconds') AS poll_interval_seconds
+                FROM f, q
+            """)
+            columns = [desc[0] for desc in cur.description]
+            stats = dict(zip(columns, cur.fetchone()))
     
-    cur.close()
-    conn.close()
+            # Config defaults when keys are missing
+            if stats['indexer_state'] is None:
+                stats['indexer_state'] = 'running'
+            if stats['poll_interval_seconds'] is None:
+                stats['poll_interval_seconds'] = 3600
     
     return stats
 
@@ -626,12 +1065,11 @@ def get_stats():
 def run_scan():
     """
     Run a full scan of all watch folders.
-    Returns (total_found, new_added, updated, skipped).
+    Returns (total_found, new_added, updated, skipped, deleted).
 
     Scan is now instant because FFprobe is deferred to enrichment phase.
     Progress is written to DB for UI visibility.
     """
-    import time
     start_time = time.time()
 
     watch_folders = get_watch_folders()
@@ -640,7 +1078,7 @@ def run_scan():
         print("  No watch folders configured")
         logger.warning("No watch folders configured")
         clear_scan_progress()
-        return 0, 0, 0, 0
+        return 0, 0, 0, 0, 0
 
     total_found = 0
     new_added = 0
@@ -648,8 +1086,17 @@ def run_scan():
     skipped = 0
     total_dirs_scanned = 0
 
+    # Listings of directories unchanged since the last scan are reused
+    use_dir_cache = get_config('scan_directory_cache', True)
+    # Optionally also trust their files to be unchanged (misses in-place rewrites)
+    skip_unchanged = use_dir_cache and get_config('scan_skip_unchanged_files', False)
+    previous_dirs = load_directory_cache(watch_folders) if use_dir_cache else {}
+    dir_cache = dict(previous_dirs) if use_dir_cache else None
+
     # Phase 1: Discover video files (fast - no FFprobe)
     all_videos = []
+    failed_dirs = []  # Listings that failed; their files aren't treated as missing
+    file_stats = {}
     for folder in watch_folders:
         print(f"  Discovering videos in: {folder}")
         logger.info(f"Discovering videos in: {folder}")
@@ -668,54 +1115,72 @@ def run_scan():
             dirs_scanned=total_dirs_scanned
         )
 
-        videos, dirs_scanned = scan_folder(folder, on_progress=on_progress)
+        videos, dirs_scanned = scan_folder(
+            folder, on_progress=on_progress, dir_cache=dir_cache, file_stats=file_stats,
+            failed_dirs=failed_dirs
+        )
         all_videos.extend(videos)
         total_dirs_scanned += dirs_scanned
 
+    if use_dir_cache:
+        save_directory_cache(dir_cache, previous_dirs)
+
+    # Overlapping watch folders (e.g. /media and /media/tv) find the same videos twice
+    all_videos = list(dict.fromkeys(all_videos))
     total_found = len(all_videos)
     logger.info(f"Discovery complete: {total_found} videos found")
     print(f"  Found {total_found} video files")
 
-    # Phase 2: Process files (add to DB - still fast since FFprobe is deferred)
+    # Videos from reused listings have no stat result from this scan
+    assume_unchanged = {path for path in all_videos if path not in file_stats} if skip_unchanged else None
+
+    # Phase 2: Process files in batches (add to DB - still fast since FFprobe is deferred)
     update_scan_progress(
         phase='processing',
         files_found=total_found,
         files_processed=0
     )
 
-    for i, filepath in enumerate(all_videos):
-        file_id, is_new, was_updated = add_file_to_db(filepath, defer_probe=True)
-
-        if file_id is None:
-            # File couldn't be accessed (permissions, etc.)
-            skipped += 1
-            logger.debug(f"Skipped inaccessible file: {filepath}")
-            continue
-
-        if is_new:
-            new_added += 1
-            print(f"    + {os.path.basename(filepath)}")
-            logger.info(f"New file: {filepath}")
-        elif was_updated:
-            updated += 1
-            print(f"    ↻ {os.path.basename(filepath)} (modified)")
-            logger.info(f"Modified file: {filepath}")
-
-        # Update progress every 10 files or at end
-        if (i + 1) % 10 == 0 or i == len(all_videos) - 1:
-            update_scan_progress(
-                phase='processing',
-                files_found=total_found,
-                files_processed=i + 1,
-                files_new=new_added,
-                files_updated=updated,
-                files_skipped=skipped
-            )
+    # One read of the files table; batches below only write
+    indexed = load_indexed_files(watch_folders) if all_videos else {}
+    already_indexed = sum(1 for path in all_videos if path in indexed)
+    logger.info(f"{already_indexed}/{total_found} discovered videos already indexed")
+
+    for start in range(0, total_found, SCAN_BATCH_SIZE):
+        batch = all_videos[start:start + SCAN_BATCH_SIZE]
+
+        for filepath, (file_id, is_new, was_updated) in zip(batch, add_files_to_db(batch, file_stats, assume_unchanged, indexed)):
+            if file_id is None:
+                # File couldn't be accessed (permissions, etc.)
+                skipped += 1
+                logger.debug(f"Skipped inaccessible file: {filepath}")
+                continue
+
+            if is_new:
+                new_added += 1
+                print(f"    + {os.path.basename(filepath)}")
+                logger.info(f"New file: {filepath}")
+            elif was_updated:
+                updated += 1
+                print(f"    ↻ {os.path.basename(filepath)} (modified)")
+                logger.info(f"Modified file: {filepath}")
+
+        # Update progress after each batch
+        update_scan_progress(
+            phase='processing',
+            files_found=total_found,
+            files_processed=start + len(batch),
+            files_new=new_added,
+            files_updated=updated,
+            files_skipped=skipped
+        )
 
     # Phase 3: Mark missing files
     update_scan_progress(phase='checking_missing')
     logger.info("Checking for missing files...")
-    deleted = mark_missing_files(watch_folders)
+    if failed_dirs:
+        logger.warning(f"{len(failed_dirs)} directories could not be listed; not checking them for missing files")
+    deleted = mark_missing_files(watch_folders, observed_paths=set(all_videos), unlisted_dirs=failed_dirs)
     if deleted > 0:
         print(f"  Marked {deleted} missing files as deleted")
         logger.info(f"Marked {deleted} missing files as deleted")
@@ -742,4 +1207,4 @@ def run_scan():
 
     logger.info(f"Scan complete in {duration_ms}ms: {total_found} found, {new_added} new, {updated} modified")
 
-    return total_found, new_added, updated, skipped
+    return total_found, new_added, updated, skipped, deleted
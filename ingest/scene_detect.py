@@ -1,25 +1,47 @@
 """
-Scene detection using PySceneDetect.
+Scene detection using PySceneDetect (or ffmpeg's scene score, see detect_scenes_ffmpeg).
 Detects scene cuts and extracts poster frames.
 """
 
 import os
+import re
 import subprocess
-from scenedetect import detect, ContentDetector, AdaptiveDetector
+from PIL import Image
+from psycopg2.extras import execute_values
+from scenedetect import detect, ContentDetector
 from db import get_connection
-from progress import Spinner, progress_counter, progress_done
-from scanner import get_config
+from progress import progress_counter, progress_done
+from scanner import load_all_config, get_video_metadata_cached
 
 # Where to store extracted poster frames
 POSTER_DIR = "/app/posters"
 
+# Short side of the CLIP-sized poster copy (matches CLIP's preprocess resize)
+CLIP_POSTER_SIZE = 224
+
+# Posters extracted per ffmpeg process (each is a separately seeked input)
+FRAME_BATCH_SIZE = 16
+
+# ffmpeg scene detector (scene_detector = 'ffmpeg'): scene score (0-1) that counts
+# as a cut, and the minimum scene length in frames (PySceneDetect's default too)
+FFMPEG_SCENE_THRESHOLD = 0.27
+MIN_SCENE_FRAMES = 15
+
+# ffmpeg timeout: a fixed allowance plus this many seconds per second of video, so a
+# hung decode (bad file, stalled network mount) falls back instead of blocking a worker
+FFMPEG_TIMEOUT_BASE = 60
+FFMPEG_TIMEOUT_PER_SECOND = 2
+
+_PTS_TIME = re.compile(rb'pts_time:([0-9.]+)')
+
 
 def get_poster_settings():
     """Get poster frame settings from config."""
+    config = load_all_config()
     return {
-        'width': get_config('poster_width', 1280),       # 720p width
-        'format': get_config('poster_format', 'webp'),
-        'quality': get_config('poster_quality', 80)
+        'width': config.get('poster_width', 1280),       # 720p width
+        'format': config.get('poster_format', 'webp'),
+        'quality': config.get('poster_quality', 80)
     }
 
 
@@ -28,119 +50,202 @@ def ensure_poster_dir():
     os.makedirs(POSTER_DIR, exist_ok=True)
 
 
-def get_video_duration(video_path):
-    """Get video duration in seconds using ffprobe."""
-    cmd = [
-        'ffprobe', '-v', 'error',
-        '-show_entries', 'format=duration',
-        '-of', 'default=noprint_wrappers=1:nokey=1',
-        video_path
-    ]
-    try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-        return float(result.stdout.strip())
-    except Exception as e:
-        print(f"    ⚠️  Could not get duration: {e}")
-        return None
+def get_video_timing(video_path):
+    """
+    Get (fps, duration_seconds) with a single (cached) ffprobe call.
+    fps defaults to 24 and duration to None if they can't be read.
+    """
+    metadata = get_video_metadata_cached(video_path)
+    fps = metadata.get('fps')
+    if not fps:
+        print(f"    ⚠️  Could not get FPS, defaulting to 24")
+        fps = 24.0
+    return fps, metadata.get('duration_seconds')
 
 
-def get_video_fps(video_path):
-    """Get video frame rate using ffprobe."""
-    cmd = [
-        'ffprobe', '-v', 'error',
-        '-select_streams', 'v:0',
-        '-show_entries', 'stream=r_frame_rate',
-        '-of', 'default=noprint_wrappers=1:nokey=1',
-        video_path
-    ]
-    try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-        # r_frame_rate returns as fraction like "24000/1001" or "24/1"
-        fps_str = result.stdout.strip()
-        if '/' in fps_str:
-            num, den = fps_str.split('/')
-            return float(num) / float(den)
-        return float(fps_str)
-    except Exception as e:
-        print(f"    ⚠️  Could not get FPS, defaulting to 24: {e}")
-        return 24.0
+def get_probed_timing(file_id):
+    """
+    Get (fps, duration_seconds) already stored for a file by the metadata stage.
+    Either value is None if it wasn't probed.
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT fps, duration_seconds FROM files WHERE id = %s", (file_id,))
+    row = cur.fetchone()
+    cur.close()
+    conn.close()
+    return row if row else (None, None)
 
 
-def extract_frame(video_path, timecode, output_path, width=1280, quality=80):
+def extract_frame(video_path, timecode, output_path, width=1280, quality=80, clip_path=None):
     """
     Extract a single frame at the given timecode using ffmpeg.
     Scales to specified width (maintaining aspect ratio) and outputs WebP.
+    If clip_path is given, the same decoded frame is also written there as a
+    CLIP-sized JPEG (short side CLIP_POSTER_SIZE), so it isn't re-read from the poster.
+    """
+    return extract_frames(video_path, [(timecode, output_path, clip_path)], width, quality)[0]
+
+
+def extract_frames(video_path, frames, width=1280, quality=80):
+    """
+    Extract several frames with one ffmpeg process.
+    frames is a list of (timecode, output_path, clip_path or None). Each frame is its
+    own fast-seeked input, so the output matches extract_frame, but the process start
+    and container probe are paid once per call instead of once per frame.
+    Returns a list of booleans (poster written) aligned with frames.
     """
-    # Determine format from extension
-    _, ext = os.path.splitext(output_path)
-    
     # Build filter for scaling (maintain aspect ratio)
     scale_filter = f"scale={width}:-2"  # -2 ensures even height
+    clip_scale = (
+        f"scale=w='if(gt(iw,ih),-2,{CLIP_POSTER_SIZE})'"
+        f":h='if(gt(iw,ih),{CLIP_POSTER_SIZE},-2)':flags=bicubic"
+    )
     
-    # Quality settings vary by format
-    if ext.lower() == '.webp':
-        quality_args = ['-quality', str(quality)]
-    else:
-        quality_args = ['-q:v', '2']  # JPG quality
+    input_args = []
+    graph = []
+    output_args = []
+    for i, (timecode, output_path, clip_path) in enumerate(frames):
+        input_args += ['-ss', str(timecode), '-i', video_path]
+        
+        # Quality settings vary by format
+        _, ext = os.path.splitext(output_path)
+        if ext.lower() == '.webp':
+            quality_args = ['-quality', str(quality)]
+        else:
+            quality_args = ['-q:v', '2']  # JPG quality
+        
+        if clip_path:
+            # Decode once, split into the poster and the CLIP copy
+            graph.append(f"[{i}:v]split=2[p{i}][c{i}];[p{i}]{scale_filter}[poster{i}];[c{i}]{clip_scale}[clip{i}]")
+            output_args += [
+                '-map', f'[poster{i}]', '-frames:v', '1', *quality_args, output_path,
+                '-map', f'[clip{i}]', '-frames:v', '1', '-q:v', '2', clip_path,
+            ]
+        else:
+            graph.append(f"[{i}:v]{scale_filter}[poster{i}]")
+            output_args += ['-map', f'[poster{i}]', '-frames:v', '1', *quality_args, output_path]
     
     cmd = [
         'ffmpeg', '-y',
-        '-ss', str(timecode),
-        '-i', video_path,
-        '-frames:v', '1',
-        '-vf', scale_filter,
-        *quality_args,
-        output_path
+        *input_args,
+        '-filter_complex', ';'.join(graph),
+        *output_args
     ]
     try:
-        subprocess.run(cmd, capture_output=True, timeout=30)
-        return os.path.exists(output_path)
+        subprocess.run(cmd, capture_output=True, timeout=30 * len(frames))
     except Exception as e:
-        print(f"    ⚠️  Could not extract frame: {e}")
+        print(f"    ⚠️  Could not extract frames: {e}")
+    return [os.path.exists(output_path) for _, output_path, _ in frames]
+
+
+def clip_poster_path(poster_path):
+    """Path of the CLIP-sized copy stored next to a poster frame."""
+    base, _ = os.path.splitext(poster_path)
+    return f"{base}_clip.jpg"
+
+
+def write_clip_poster(poster_path):
+    """
+    Write a copy of the poster with its short side scaled to CLIP_POSTER_SIZE.
+    CLIP's preprocess then only has to center-crop a small image instead of
+    resizing a full-size poster on every (re-)embed.
+    """
+    try:
+        image = Image.open(poster_path).convert('RGB')
+        scale = CLIP_POSTER_SIZE / min(image.size)
+        size = (
+            max(CLIP_POSTER_SIZE, round(image.width * scale)),
+            max(CLIP_POSTER_SIZE, round(image.height * scale)),
+        )
+        image.resize(size, Image.BICUBIC).save(clip_poster_path(poster_path), quality=95)
+        return True
+    except Exception as e:
+        print(f"    ⚠️  Could not write CLIP poster: {e}")
         return False
 
 
-def detect_scenes(video_path, file_id):
+def detect_scenes_ffmpeg(video_path, duration, fps):
     """
-    Detect scenes in a video and save to database.
-    Returns number of scenes detected.
+    Detect cuts with ffmpeg's scene score filter (one decode pass in C, hwaccel if available)
+    instead of PySceneDetect's per-frame Python loop.
+    Returns a list of (start_seconds, end_seconds), [] if there are no cuts,
+    or None if ffmpeg failed or timed out (caller falls back to PySceneDetect).
+    """
+    if not duration:
+        return None
+    cmd = [
+        'ffmpeg', '-hide_banner', '-nostats',
+        '-hwaccel', 'auto',
+        '-i', video_path,
+        '-an', '-sn', '-dn',
+        '-vf', f"select='gt(scene,{FFMPEG_SCENE_THRESHOLD})',metadata=print:file=-",
+        '-f', 'null', '-'
+    ]
+    try:
+        result = subprocess.run(
+            cmd, capture_output=True,
+            timeout=FFMPEG_TIMEOUT_BASE + FFMPEG_TIMEOUT_PER_SECOND * duration
+        )
+    except subprocess.TimeoutExpired:
+        print(f"    ⚠️  ffmpeg scene detection timed out: {os.path.basename(video_path)}")
+        return None
+    except Exception as e:
+        print(f"    ⚠️  ffmpeg scene detection failed: {e}")
+        return None
+    if result.returncode != 0:
+        return None
+    
+    # Drop cuts closer than MIN_SCENE_FRAMES to the previous one
+    min_gap = MIN_SCENE_FRAMES / fps
+    cuts = []
+    for match in _PTS_TIME.finditer(result.stdout):
+        cut = float(match.group(1))
+        if min_gap <= cut < duration and cut - (cuts[-1] if cuts else 0) >= min_gap:
+            cuts.append(cut)
+    
+    if not cuts:
+        return []
+    bounds = [0.0, *cuts, duration]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def find_scenes(video_path, file_id, fps, duration, poster_settings, detector='pyscenedetect', show_progress=True):
+    """
+    Detect scenes and extract their poster frames, without touching the database
+    (so it can run in a worker process, see find_scenes_worker).
+    Returns a list of (start_tc, end_tc, poster_path or None) in scene order.
     """
     ensure_poster_dir()
     
-    # Get poster settings
-    poster_settings = get_poster_settings()
     poster_width = poster_settings['width']
-    poster_format = poster_settings['format']
     poster_quality = poster_settings['quality']
-    poster_ext = f".{poster_format}"
+    poster_ext = f".{poster_settings['format']}"
     
-    print(f"    Detecting scenes...")
+    scene_list = None
+    if detector == 'ffmpeg':
+        scene_list = detect_scenes_ffmpeg(video_path, duration, fps)
     
-    # Use ContentDetector for scene changes
-    # threshold=27 is default, lower = more sensitive
-    scene_list = detect(video_path, ContentDetector(threshold=27))
+    if scene_list is None:
+        # Use ContentDetector for scene changes
+        # threshold=27 is default, lower = more sensitive
+        scene_list = detect(video_path, ContentDetector(threshold=27))
     
-    # Get FPS to calculate one frame duration (for avoiding overlap)
-    fps = get_video_fps(video_path)
+    # FPS gives one frame duration (for avoiding overlap)
     frame_duration = 1.0 / fps
     
     # If no scenes detected, treat whole video as one scene
     if not scene_list:
-        duration = get_video_duration(video_path)
         if duration:
             scene_list = [(0, duration)]
         else:
             scene_list = [(0, 0)]  # Fallback
     
-    conn = get_connection()
-    cur = conn.cursor()
-    
-    # Clear existing scenes for this file (in case of re-processing)
-    cur.execute("DELETE FROM scenes WHERE file_id = %s", (file_id,))
-    
-    total = len(scene_list)
+    # Scene bounds and poster paths; posters extract at the CENTER frame
+    # (for thumbnails, CLIP embedding, and player initial display)
+    scenes = []
+    poster_prefix = os.path.join(POSTER_DIR, f"{file_id}_")  # Joined once, not per scene
     for i, scene in enumerate(scene_list):
-        progress_counter(i + 1, total, "Extracting frames")
         # scene is a tuple of (start_time, end_time) or FrameTimecode objects
         if hasattr(scene[0], 'get_seconds'):
             start_tc = scene[0].get_seconds()
@@ -149,28 +254,93 @@ def detect_scenes(video_path, file_id):
             start_tc = float(scene[0])
             end_tc = float(scene[1])
         
-        # Extract CENTER frame (for thumbnails, CLIP embedding, and player initial display)
         mid_tc = (start_tc + end_tc - frame_duration) / 2
-        mid_filename = f"{file_id}_{i:04d}{poster_ext}"
-        mid_path = os.path.join(POSTER_DIR, mid_filename)
-        
-        if extract_frame(video_path, mid_tc, mid_path, poster_width, poster_quality):
-            poster_db_path = mid_path
-        else:
-            poster_db_path = None
+        mid_path = f"{poster_prefix}{i:04d}{poster_ext}"
+        scenes.append((start_tc, end_tc, mid_tc, mid_path))
+    
+    # FRAME_BATCH_SIZE posters per ffmpeg process instead of one process per scene
+    total = len(scenes)
+    extracted = []
+    for start in range(0, total, FRAME_BATCH_SIZE):
+        batch = scenes[start:start + FRAME_BATCH_SIZE]
+        frames = [(mid_tc, mid_path, clip_poster_path(mid_path)) for _, _, mid_tc, mid_path in batch]
+        results = extract_frames(video_path, frames, poster_width, poster_quality)
         
-        # Insert scene into database
-        cur.execute(
-            """
-            INSERT INTO scenes (file_id, scene_index, start_tc, end_tc, poster_frame_path)
-            VALUES (%s, %s, %s, %s, %s)
-            """,
-            (file_id, i, start_tc, end_tc, poster_db_path)
-        )
+        for frame, ok in zip(frames, results):
+            if not ok and len(frames) > 1:
+                # Retry on its own so one bad seek doesn't lose the whole batch
+                ok = extract_frame(video_path, frame[0], frame[1], poster_width, poster_quality, clip_path=frame[2])
+            if ok and not os.path.exists(frame[2]):
+                write_clip_poster(frame[1])
+            extracted.append(ok)
+        if show_progress:
+            progress_counter(len(extracted), total, "Extracting frames")
+    
+    return [
+        (start_tc, end_tc, mid_path if ok else None)
+        for (start_tc, end_tc, _, mid_path), ok in zip(scenes, extracted)
+    ]
+
+
+def find_scenes_worker(file_id, video_path, fps, duration, poster_settings, detector):
+    """
+    Process-pool entry point for find_scenes. Returns (file_id, scenes).
+    Per-frame progress is left out so concurrent workers don't interleave their logs.
+    """
+    return file_id, find_scenes(video_path, file_id, fps, duration, poster_settings, detector, show_progress=False)
+
+
+def save_scenes(file_id, scenes):
+    """Replace a file's scenes with scenes from find_scenes."""
+    conn = get_connection()
+    cur = conn.cursor()
+    
+    # Clear existing scenes for this file (in case of re-processing)
+    cur.execute("DELETE FROM scenes WHERE file_id = %s", (file_id,))
+    
+    # Insert all scenes in one statement instead of one round trip per scene
+    execute_values(
+        cur,
+        """
+        INSERT INTO scenes (file_id, scene_index, start_tc, end_tc, poster_frame_path)
+        VALUES %s
+        """,
+        [
+            (file_id, i, start_tc, end_tc, poster_path)
+            for i, (start_tc, end_tc, poster_path) in enumerate(scenes)
+        ],
+        page_size=500
+    )
     
     conn.commit()
     cur.close()
     conn.close()
+
+
+def get_scene_timing(file_id, video_path):
+    """
+    Get (fps, duration_seconds) for scene detection.
+    Reuses the values from the metadata stage; only probes (once) if they're missing.
+    """
+    fps, duration = get_probed_timing(file_id)
+    if not fps or not duration:
+        fps, duration = get_video_timing(video_path)
+    return fps, duration
+
+
+def detect_scenes(video_path, file_id):
+    """
+    Detect scenes in a video and save to database.
+    Returns number of scenes detected.
+    """
+    print(f"    Detecting scenes...")
+    
+    fps, duration = get_scene_timing(file_id, video_path)
+    detector = load_all_config().get('scene_detector', 'pyscenedetect')
+    
+    # Connect only after extraction so no transaction sits open while ffmpeg runs
+    scenes = find_scenes(video_path, file_id, fps, duration, get_poster_settings(), detector)
+    save_scenes(file_id, scenes)
     
-    progress_done(f"{total} scenes detected")
-    return total
+    progress_done(f"{len(scenes)} scenes detected")
+    return len(scenes)
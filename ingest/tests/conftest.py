@@ -59,6 +59,8 @@ def clean_db(db_connection):
         cur.execute("DELETE FROM scenes")
         cur.execute("DELETE FROM enrichment_queue")
         cur.execute("DELETE FROM files")
+        cur.execute("DELETE FROM probe_cache")
+        cur.execute("DELETE FROM scan_directories")
         db_connection.commit()
         cur.close()
     
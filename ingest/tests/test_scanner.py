@@ -4,6 +4,7 @@ Tests for file scanner functionality.
 
 import os
 import shutil
+import tempfile
 import pytest
 from pathlib import Path
 
@@ -14,10 +15,13 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 from scanner import (
     get_video_extensions,
     get_video_metadata,
+    get_video_metadata_cached,
     get_file_metadata,
     is_video_file,
     scan_folder,
     add_file_to_db,
+    add_files_to_db,
+    load_indexed_files,
     mark_missing_files,
     get_stats,
 )
@@ -48,6 +52,13 @@ class TestVideoExtensions:
         assert is_video_file("/path/to/file.txt") is False
         assert is_video_file("/path/to/image.jpg") is False
         assert is_video_file("/path/to/audio.mp3") is False
+    
+    def test_is_video_file_suffix_rules(self):
+        """Should match os.path.splitext semantics, case-insensitively."""
+        assert is_video_file("/path/to/Clip.MP4") is True
+        assert is_video_file("/path/to/archive.mp4.txt") is False
+        assert is_video_file("/path/to/.mp4") is False  # Dotfile, no extension
+        assert is_video_file("/path/dir.mp4/readme") is False
 
 
 class TestMetadataExtraction:
@@ -80,6 +91,20 @@ class TestMetadataExtraction:
         assert meta is not None
         # Most fields will be None for corrupted files
     
+    def test_video_metadata_cached_after_move(self, clean_db, test_video_normal, temp_watch_folder):
+        """Should reuse probe results for the same content at a new path."""
+        meta = get_video_metadata_cached(test_video_normal)
+        
+        moved = os.path.join(temp_watch_folder, "renamed.mp4")
+        shutil.copy2(test_video_normal, moved)  # copy2 keeps mtime, like a move
+        
+        assert get_video_metadata_cached(moved) == meta
+        
+        cur = clean_db.cursor()
+        cur.execute("SELECT COUNT(*) FROM probe_cache")
+        assert cur.fetchone()[0] == 1
+        cur.close()
+    
     def test_file_metadata(self, test_video_normal):
         """Should extract file system metadata."""
         meta = get_file_metadata(test_video_normal)
@@ -128,6 +153,66 @@ class TestFileScanning:
         assert "subdir" in files[0]
         assert dirs_scanned == 2  # Root + subdir
 
+    def test_scan_folder_skips_non_regular(self, temp_watch_folder, test_video_normal):
+        """Should skip symlinks, symlinked directories and special files."""
+        outside = tempfile.mkdtemp()
+        try:
+            target = os.path.join(outside, "video.mp4")
+            shutil.copy(test_video_normal, target)
+            os.symlink(target, os.path.join(temp_watch_folder, "link.mp4"))
+            os.symlink(outside, os.path.join(temp_watch_folder, "linked_dir"))
+            os.mkfifo(os.path.join(temp_watch_folder, "pipe.mp4"))
+
+            files, dirs_scanned = scan_folder(temp_watch_folder)
+            assert files == []
+            assert dirs_scanned == 1
+        finally:
+            shutil.rmtree(outside)
+
+    def test_scan_folder_deep_tree(self, temp_watch_folder, test_video_normal):
+        """Should scan trees deeper than the Python recursion limit."""
+        depth = sys.getrecursionlimit() + 100
+        deepest = temp_watch_folder
+        for _ in range(depth):  # os.makedirs itself recurses per level
+            deepest = os.path.join(deepest, "d")
+            os.mkdir(deepest)
+        video = os.path.join(deepest, "video.mp4")
+        shutil.copy(test_video_normal, video)
+
+        try:
+            files, dirs_scanned = scan_folder(temp_watch_folder)
+            assert len(files) == 1
+            assert dirs_scanned == depth + 1
+        finally:
+            # Remove bottom-up here; shutil.rmtree recurses per level too
+            os.remove(video)
+            while deepest != temp_watch_folder:
+                os.rmdir(deepest)
+                deepest = os.path.dirname(deepest)
+
+    def test_scan_folder_dir_cache(self, temp_watch_folder, test_video_normal):
+        """Should reuse cached listings of unchanged directories and rescan changed ones."""
+        subdir = os.path.join(temp_watch_folder, "subdir")
+        os.makedirs(subdir)
+        shutil.copy(test_video_normal, os.path.join(subdir, "video.mp4"))
+
+        dir_cache = {}
+        files, _ = scan_folder(temp_watch_folder, dir_cache=dir_cache)
+        assert len(files) == 1
+        assert set(dir_cache) == {temp_watch_folder, subdir}
+
+        # A stale cached listing is used as-is while the directory mtime matches
+        mtime, subdirs, _ = dir_cache[subdir]
+        dir_cache[subdir] = (mtime, subdirs, [])
+        files, dirs_scanned = scan_folder(temp_watch_folder, dir_cache=dir_cache)
+        assert files == []
+        assert dirs_scanned == 2
+
+        # A changed mtime forces a rescan
+        dir_cache[subdir] = (mtime - 10, subdirs, [])
+        files, _ = scan_folder(temp_watch_folder, dir_cache=dir_cache)
+        assert len(files) == 1
+
     def test_scan_missing_folder(self):
         """Should handle missing folders gracefully."""
         files, dirs_scanned = scan_folder("/nonexistent/path")
@@ -177,6 +262,57 @@ class TestDatabaseOperations:
         
         assert count == 1
     
+    def test_add_files_batch(self, clean_db, test_video_normal, temp_watch_folder):
+        """Should add a batch of files in one pass and skip inaccessible ones."""
+        dest = os.path.join(temp_watch_folder, "video.mp4")
+        shutil.copy(test_video_normal, dest)
+        missing = os.path.join(temp_watch_folder, "missing.mp4")
+        
+        results = add_files_to_db([test_video_normal, missing, dest])
+        
+        assert len(results) == 3
+        assert results[0][0] is not None and results[0][1] is True
+        assert results[1] == (None, False, False)
+        assert results[2][0] is not None and results[2][1] is True
+        
+        # Re-adding returns the same IDs, not new
+        again = add_files_to_db([test_video_normal, dest])
+        assert again == [(results[0][0], False, False), (results[2][0], False, False)]
+        
+        # Same answer from a preloaded index (no per-batch SELECT)
+        preloaded = add_files_to_db([test_video_normal, dest], indexed=load_indexed_files())
+        assert preloaded == again
+        
+        # Restricting the preload to a folder only drops rows outside it
+        in_folder = load_indexed_files([temp_watch_folder])
+        assert dest in in_folder and test_video_normal not in in_folder
+        
+        # Both files are queued for enrichment
+        cur = clean_db.cursor()
+        cur.execute("SELECT COUNT(*) FROM enrichment_queue WHERE status = 'pending'")
+        assert cur.fetchone()[0] == 2
+        cur.close()
+    
+    def test_add_files_batch_duplicates(self, clean_db, test_video_normal, temp_watch_folder):
+        """Should insert a path once when it repeats in a batch or across batches."""
+        dest = os.path.join(temp_watch_folder, "video.mp4")
+        shutil.copy(test_video_normal, dest)
+        
+        # Same shared preload as run_scan (empty: nothing indexed yet)
+        indexed = load_indexed_files([temp_watch_folder])
+        first = add_files_to_db([dest, dest], indexed=indexed)
+        assert first[0] == first[1]
+        assert first[0][1] is True
+        
+        # A later batch of the same scan sees the row inserted above
+        later = add_files_to_db([dest], indexed=indexed)
+        assert later == [(first[0][0], False, False)]
+        
+        cur = clean_db.cursor()
+        cur.execute("SELECT COUNT(*) FROM files WHERE path = %s", (dest,))
+        assert cur.fetchone()[0] == 1
+        cur.close()
+    
     def test_mark_missing_files(self, clean_db, test_video_normal, temp_watch_folder):
         """Should soft-delete files that no longer exist."""
         # Copy test video to watch folder
@@ -201,6 +337,55 @@ class TestDatabaseOperations:
         cur.close()
 
 
+    def test_mark_missing_files_observed(self, clean_db, test_video_normal, temp_watch_folder):
+        """Should soft-delete files missing from a fresh scan without stat-ing them."""
+        kept = os.path.join(temp_watch_folder, "kept.mp4")
+        gone = os.path.join(temp_watch_folder, "gone.mp4")
+        shutil.copy(test_video_normal, kept)
+        shutil.copy(test_video_normal, gone)
+        kept_id, _, _ = add_file_to_db(kept)
+        gone_id, _, _ = add_file_to_db(gone)
+        
+        # gone.mp4 still exists on disk but wasn't observed by the scan
+        deleted = mark_missing_files([temp_watch_folder], observed_paths={kept})
+        assert deleted == 1
+        
+        cur = clean_db.cursor()
+        cur.execute("SELECT id FROM files WHERE deleted_at IS NOT NULL")
+        assert [row[0] for row in cur.fetchall()] == [gone_id]
+        cur.close()
+
+    def test_mark_missing_files_unreadable_subdir(self, clean_db, test_video_normal, temp_watch_folder):
+        """Should not soft-delete files under a directory the scan couldn't list."""
+        subdir = os.path.join(temp_watch_folder, "locked")
+        os.makedirs(subdir)
+        video = os.path.join(subdir, "video.mp4")
+        shutil.copy(test_video_normal, video)
+        file_id, _, _ = add_file_to_db(video)
+        
+        os.chmod(subdir, 0)
+        try:
+            if os.access(subdir, os.R_OK):
+                pytest.skip("permissions not enforced (running as root)")
+            
+            failed_dirs = []
+            files, _ = scan_folder(temp_watch_folder, failed_dirs=failed_dirs)
+            assert files == []
+            assert failed_dirs == [subdir]
+            
+            deleted = mark_missing_files(
+                [temp_watch_folder], observed_paths=set(files), unlisted_dirs=failed_dirs
+            )
+            assert deleted == 0
+        finally:
+            os.chmod(subdir, 0o755)
+        
+        cur = clean_db.cursor()
+        cur.execute("SELECT deleted_at FROM files WHERE id = %s", (file_id,))
+        assert cur.fetchone()[0] is None
+        cur.close()
+
+
 class TestStats:
     """Tests for statistics gathering."""
     
@@ -1,11 +1,19 @@
 """
 Transcript embedding for semantic dialog search.
-Uses sentence-transformers (all-MiniLM-L6-v2) with MPS on Apple Silicon, CPU fallback.
+Uses sentence-transformers (all-MiniLM-L6-v2) with MPS on Apple Silicon. On CPU, can run the
+model's int8-quantized ONNX export with onnxruntime instead (opt in, see OnnxEncoder).
 Enables semantic matching: "1" ↔ "one", "car" ↔ "vehicle", etc.
 """
 
+import os
+import platform
+import numpy as np
+import onnxruntime
 import torch
+from huggingface_hub import hf_hub_download
+from psycopg2.extras import execute_values
 from sentence_transformers import SentenceTransformer
+from transformers import AutoTokenizer
 from db import get_connection
 
 # Model config
@@ -13,6 +21,15 @@ MODEL_NAME = 'all-MiniLM-L6-v2'
 MODEL_VERSION = 'all-MiniLM-L6-v2'
 EMBEDDING_DIM = 384
 
+# Transcripts per forward pass
+ENCODE_BATCH_SIZE = 32
+
+# Quantized ONNX exports published with the model (opt in on CPU with TRANSCRIPT_EMBED_ONNX=1).
+# Off by default: stored transcript embeddings are compared against fp32 query embeddings
+ONNX_REPO = 'sentence-transformers/all-MiniLM-L6-v2'
+USE_ONNX = os.environ.get('TRANSCRIPT_EMBED_ONNX', '0') != '0'
+MAX_SEQ_LENGTH = 256  # Same truncation as the SentenceTransformer model
+
 # Global model (loaded once)
 _model = None
 
@@ -24,6 +41,53 @@ def get_device():
     return "cpu"
 
 
+def get_onnx_file():
+    """int8 ONNX export for this CPU (arm64, else AVX2)."""
+    if platform.machine().lower() in ('arm64', 'aarch64'):
+        return 'onnx/model_qint8_arm64.onnx'
+    return 'onnx/model_quint8_avx2.onnx'
+
+
+class OnnxEncoder:
+    """
+    Stand-in for SentenceTransformer.encode running the int8 ONNX export on onnxruntime:
+    tokenize, one session run per batch, then mean pooling and L2 normalization.
+    """
+
+    def __init__(self):
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = os.cpu_count() or 0
+        self.session = onnxruntime.InferenceSession(
+            hf_hub_download(ONNX_REPO, get_onnx_file()), options, providers=['CPUExecutionProvider']
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(ONNX_REPO)
+
+    def encode(self, texts, batch_size=ENCODE_BATCH_SIZE, normalize_embeddings=False, **_):
+        single = isinstance(texts, str)
+        if single:
+            texts = [texts]
+
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            tokens = self.tokenizer(
+                texts[start:start + batch_size], padding=True, truncation=True,
+                max_length=MAX_SEQ_LENGTH, return_tensors='np'
+            )
+            feed = {name: value.astype(np.int64) for name, value in tokens.items() if name in self.input_names}
+            hidden = self.session.run(None, feed)[0]
+
+            # Mean over real (unpadded) tokens
+            mask = tokens['attention_mask'][..., None].astype(np.float32)
+            embeddings = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            if normalize_embeddings:
+                embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+            batches.append(embeddings.astype(np.float32))
+
+        embeddings = np.concatenate(batches) if batches else np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+        return embeddings[0] if single else embeddings
+
+
 def load_model():
     """Load sentence-transformer model. Downloads on first run (~80MB)."""
     global _model
@@ -33,7 +97,13 @@ def load_model():
 
     device = get_device()
     print(f"    Loading sentence-transformer model on {device} (first run downloads ~80MB)...")
-    _model = SentenceTransformer(MODEL_NAME, device=device)
+    if device == "cpu" and USE_ONNX:
+        try:
+            _model = OnnxEncoder()
+        except Exception as e:
+            print(f"    ⚠️  Could not load ONNX model, using PyTorch: {e}")
+    if _model is None:
+        _model = SentenceTransformer(MODEL_NAME, device=device)
     print(f"    ✓ Sentence-transformer model loaded on {device}")
 
     return _model
@@ -80,28 +150,36 @@ def embed_transcripts_for_file(file_id):
         conn.close()
         return 0
     
-    # Load model once for all scenes
+    scenes = [(scene_id, transcript) for scene_id, transcript in scenes if transcript.strip()]
+    
+    # Encode all transcripts in batches instead of one forward pass per scene
     model = load_model()
+    embeddings = model.encode(
+        [transcript for _, transcript in scenes],
+        batch_size=ENCODE_BATCH_SIZE,
+        normalize_embeddings=True,
+        show_progress_bar=False,
+        convert_to_numpy=True
+    )
     
-    embedded_count = 0
-    for scene_id, transcript in scenes:
-        if not transcript or not transcript.strip():
-            continue
-        
-        # Generate embedding
-        embedding = model.encode(transcript, normalize_embeddings=True)
-        
-        # Store in embeddings table
-        cur.execute("""
-            INSERT INTO embeddings (scene_id, model_name, model_version, dimension, embedding)
-            VALUES (%s, %s, %s, %s, %s)
-            ON CONFLICT (scene_id, model_name) 
-            DO UPDATE SET embedding = EXCLUDED.embedding, 
-                          model_version = EXCLUDED.model_version,
-                          created_at = NOW()
-        """, (scene_id, 'sentence-transformer', MODEL_VERSION, EMBEDDING_DIM, embedding.tolist()))
-        
-        embedded_count += 1
+    # Store in embeddings table, all rows in one statement instead of one round trip per scene
+    execute_values(
+        cur,
+        """
+        INSERT INTO embeddings (scene_id, model_name, model_version, dimension, embedding)
+        VALUES %s
+        ON CONFLICT (scene_id, model_name) 
+        DO UPDATE SET embedding = EXCLUDED.embedding, 
+                      model_version = EXCLUDED.model_version,
+                      created_at = NOW()
+        """,
+        [
+            (scene_id, 'sentence-transformer', MODEL_VERSION, EMBEDDING_DIM, embedding)
+            for (scene_id, _), embedding in zip(scenes, embeddings)
+        ],
+        page_size=200
+    )
+    embedded_count = len(scenes)
     
     conn.commit()
     cur.close()
@@ -1,7 +1,9 @@
 import os
+import threading
 import psycopg2
 from psycopg2.extras import RealDictCursor
 from psycopg2.extensions import register_adapter, adapt, new_type, register_type
+from psycopg2.pool import ThreadedConnectionPool
 from contextlib import contextmanager
 import numpy as np
 
@@ -13,53 +15,93 @@ DB_CONFIG = {
     'password': os.environ.get('DB_PASSWORD', 'fennec'),
 }
 
-# Register pgvector type adapter
+# Connections are reused across requests instead of opened per query (lazily created,
+# so the server can start before the database is up)
+_pool = None
+POOL_MIN_CONNECTIONS = 2
+POOL_MAX_CONNECTIONS = 16
+# Requests wait for a free connection here instead of getconn() raising PoolError
+# (FastAPI runs sync endpoints on a larger threadpool than the pool)
+_pool_slots = threading.BoundedSemaphore(POOL_MAX_CONNECTIONS)
+
+def vector_to_array(value, cur):
+    if value is None:
+        return None
+    # pgvector format: [0.1,0.2,0.3,...] - parsed in C, no per-element Python floats
+    return np.fromstring(value[1:-1], dtype=np.float32, sep=',')
+
+# psycopg2 type for pgvector's 'vector' (the OID is looked up once, on first use)
+_vector_type = None
+
 def register_vector_type(conn):
-    """Register the pgvector 'vector' type with psycopg2."""
-    cur = conn.cursor()
-    cur.execute("SELECT oid FROM pg_type WHERE typname = 'vector'")
-    row = cur.fetchone()
-    cur.close()
-    
-    if row:
-        vector_oid = row[0]
-        
-        def vector_to_array(value, cur):
-            if value is None:
-                return None
-            # pgvector format: [0.1,0.2,0.3,...]
-            return np.array([float(x) for x in value.strip('[]').split(',')])
-        
-        VECTOR = new_type((vector_oid,), 'VECTOR', vector_to_array)
-        register_type(VECTOR)
+    """Register the pgvector 'vector' type on this connection."""
+    global _vector_type
+    if _vector_type is None:
+        with conn.cursor() as cur:
+            cur.execute("SELECT oid FROM pg_type WHERE typname = 'vector'")
+            row = cur.fetchone()
+        if not row:
+            return  # Extension not installed (yet); try again on the next connection
+        _vector_type = new_type((row[0],), 'VECTOR', vector_to_array)
+    register_type(_vector_type, conn)
+
+def vector_from_binary(value):
+    """
+    Decode a vector fetched as vector_send(embedding) (binary, not text).
+    Layout: int16 dim, int16 unused, then dim big-endian float4s.
+    """
+    if value is None:
+        return None
+    return np.frombuffer(value, dtype='>f4', offset=4)
+
+def vectors_from_binary(values):
+    """
+    Decode a list of same-dimension vector_send() values into one (N, D) float32 matrix,
+    with one buffer join and one byte-swap instead of an array per row.
+    """
+    if not values:
+        return np.empty((0, 0), dtype=np.float32)
+    dim = len(values[0]) // 4 - 1
+    rows = np.frombuffer(b''.join(values), dtype='>f4').reshape(len(values), dim + 1)
+    return rows[:, 1:].astype(np.float32)  # Column 0 is the dim/unused header
 
-# Adapter for numpy arrays -> pgvector
+# Adapter for numpy arrays -> pgvector text literal ('[0.1,0.2,...]').
+# tolist() converts to Python floats in C, instead of a numpy scalar + str() per element.
+# 9 significant digits round-trip a float4 exactly, in about half the text of a float64
+# repr (0.100000001 vs 0.10000000149011612), and format in one % operation.
 def adapt_numpy_array(arr):
-    return adapt('[' + ','.join(str(x) for x in arr) + ']')
+    values = arr.tolist()
+    return adapt('[' + ','.join(['%.9g'] * len(values)) % tuple(values) + ']')
 
 register_adapter(np.ndarray, adapt_numpy_array)
 
-# Register on first connection
-_vector_registered = False
+def get_pool():
+    """Get the shared connection pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        _pool = ThreadedConnectionPool(POOL_MIN_CONNECTIONS, POOL_MAX_CONNECTIONS, **DB_CONFIG)
+    return _pool
 
 @contextmanager
 def get_db():
-    """Context manager for database connections."""
-    global _vector_registered
-    conn = psycopg2.connect(**DB_CONFIG)
-    
-    if not _vector_registered:
+    """Context manager for database connections (borrowed from the pool)."""
+    pool = get_pool()
+    with _pool_slots:
+        conn = pool.getconn()
+        
+        # Per connection (cheap once the OID is known), so every pooled or
+        # replacement connection decodes vectors, not just the first one
         register_vector_type(conn)
-        _vector_registered = True
-    
-    try:
-        yield conn
-        conn.commit()
-    except Exception:
-        conn.rollback()
-        raise
-    finally:
-        conn.close()
+        
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            pool.putconn(conn, close=bool(conn.closed))
 
 def fetch_one(query, params=None):
     """Execute query and return single row as dict."""
@@ -75,6 +117,16 @@ def fetch_all(query, params=None):
             cur.execute(query, params)
             return cur.fetchall()
 
+def fetch_all_tuples(query, params=None):
+    """
+    Execute query and return all rows as plain tuples.
+    For large internal lookups, skipping a dict (and a key per column) per row.
+    """
+    with get_db() as conn:
+        with conn.cursor() as cur:
+            cur.execute(query, params)
+            return cur.fetchall()
+
 def execute(query, params=None):
     """Execute a query without returning results."""
     with get_db() as conn:
@@ -6,6 +6,7 @@ FastAPI backend for video search with CLIP, Whisper, and face filtering
 import os
 import json
 from contextlib import asynccontextmanager
+from functools import lru_cache
 from pathlib import Path
 from typing import Optional, List, Any
 from fastapi import FastAPI, Query, HTTPException, Request
@@ -14,7 +15,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import numpy as np
 
-from db import fetch_one, fetch_all, execute
+from db import fetch_one, fetch_all, fetch_all_tuples, execute, vector_from_binary, vectors_from_binary
 
 
 @asynccontextmanager
@@ -79,18 +80,27 @@ def get_clip_model():
             return None, None
     return _clip_model, _clip_tokenizer
 
-def embed_text(text: str) -> Optional[List[float]]:
-    """Embed text using CLIP."""
-    import torch
-    model, tokenizer = get_clip_model()
+def embed_text(text: str) -> Optional[tuple]:
+    """Embed text using CLIP (None if the model couldn't be loaded)."""
+    model, _ = get_clip_model()
     if model is None:
         return None
+    return embed_text_cached(text)
+
+@lru_cache(maxsize=4096)
+def embed_text_cached(text: str) -> tuple:
+    """
+    CLIP text embedding, cached per query string (repeat searches, paging).
+    Shared between callers, so it's an immutable tuple.
+    """
+    import torch
+    model, tokenizer = get_clip_model()
 
     with torch.no_grad():
         tokens = tokenizer([text])
         embedding = model.encode_text(tokens)
         embedding = embedding / embedding.norm(dim=-1, keepdim=True)
-        return embedding[0].cpu().numpy().tolist()
+        return tuple(embedding[0].cpu().numpy().tolist())
 
 
 # Load sentence-transformer model lazily (for semantic transcript search)
@@ -119,6 +129,31 @@ def embed_transcript_text(text: str) -> Optional[List[float]]:
     return embedding.tolist()
 
 
+def filter_by_similarity(scenes: list, query, embeddings: list, threshold: float, key: str) -> list:
+    """
+    Keep scenes whose embedding . query >= threshold, sorted by similarity (descending),
+    storing it on each kept scene under key. embeddings is aligned with scenes and holds
+    vector_send() values (None = skip), decoded straight into one float32 matrix.
+    Scores all scenes with one matrix-vector product instead of an np.dot per scene.
+    """
+    indices = [i for i, emb in enumerate(embeddings) if emb is not None]
+    if not indices:
+        return []
+
+    matrix = vectors_from_binary([embeddings[i] for i in indices])
+    similarities = matrix @ np.asarray(query, dtype=np.float32)
+
+    filtered = []
+    for j in np.argsort(-similarities, kind='stable'):
+        similarity = float(similarities[j])
+        if similarity < threshold:
+            break  # Sorted, so the rest are below too
+        scene = scenes[indices[j]]
+        scene[key] = similarity
+        filtered.append(scene)
+    return filtered
+
+
 def get_search_thresholds() -> dict:
     """Get search thresholds from config with fallback defaults."""
     defaults = {
@@ -349,6 +384,11 @@ async def search(
     if transcript_threshold is None:
         transcript_threshold = config_thresholds['transcript']
     
+    # CLIP vectors are only needed by the visual filters; when they are, fetch them
+    # in pgvector's binary form (vector_send) instead of parsing text
+    needs_clip = bool(visual) or visual_match_scene_id is not None
+    clip_column = "vector_send(e.embedding)" if needs_clip else "NULL"
+    
     # Start with all scenes (join embeddings for CLIP vectors)
     # Only show scenes from files that have completed enrichment
     base_query = """
@@ -359,7 +399,7 @@ async def search(
             s.end_tc as end_time,
             s.transcript,
             s.poster_frame_path,
-            e.embedding as clip_embedding,
+            """ + clip_column + """ as clip_embedding,
             f.id as file_id,
             f.filename,
             f.path,
@@ -446,16 +486,10 @@ async def search(
     if visual:
         text_embedding = embed_text(visual)
         if text_embedding:
-            text_emb_np = np.array(text_embedding)
-            for scene in scenes:
-                emb = scene.get('clip_embedding')
-                if emb is not None:
-                    similarity = float(np.dot(text_emb_np, emb))
-                    if similarity >= visual_threshold:
-                        scene['similarity'] = similarity
-                        results.append(scene)
-            # Sort by similarity descending
-            results.sort(key=lambda x: x.get('similarity', 0), reverse=True)
+            results = filter_by_similarity(
+                scenes, text_embedding, [scene.get('clip_embedding') for scene in scenes],
+                visual_threshold, 'similarity'
+            )
         else:
             # Fallback: no CLIP model, just use transcript match
             results = scenes
@@ -465,57 +499,42 @@ async def search(
     # Visual match filter (find scenes similar to reference scene)
     if visual_match_scene_id is not None:
         ref_scene = fetch_one("""
-            SELECT e.embedding as clip_embedding
+            SELECT vector_send(e.embedding) as clip_embedding
             FROM scenes s
             JOIN embeddings e ON s.id = e.scene_id AND e.model_name = 'clip'
             WHERE s.id = %s
         """, (visual_match_scene_id,))
         
         if ref_scene and ref_scene.get('clip_embedding') is not None:
-            ref_emb = ref_scene['clip_embedding']
-            filtered = []
-            for scene in results:
-                emb = scene.get('clip_embedding')
-                if emb is not None:
-                    similarity = float(np.dot(ref_emb, emb))
-                    if similarity >= visual_match_threshold:
-                        scene['similarity'] = similarity
-                        filtered.append(scene)
-            # Sort by similarity descending
-            filtered.sort(key=lambda x: x.get('similarity', 0), reverse=True)
-            results = filtered
+            results = filter_by_similarity(
+                results, vector_from_binary(ref_scene['clip_embedding']),
+                [scene.get('clip_embedding') for scene in results],
+                visual_match_threshold, 'similarity'
+            )
     
     # Face filter - lookup by unique face ID
-    ref_emb = None
+    has_ref_face = False
 
     if face_id is not None:
         ref_face = fetch_one("""
-            SELECT embedding FROM faces WHERE id = %s
+            SELECT id FROM faces WHERE id = %s AND embedding IS NOT NULL
         """, (face_id,))
-        if ref_face and ref_face.get('embedding') is not None:
-            ref_emb = ref_face['embedding']
+        has_ref_face = ref_face is not None
 
-    if ref_emb is not None:
+    if has_ref_face:
         scene_ids = [s['id'] for s in results]
         
         if scene_ids:
-            # Find scenes with matching faces
-            placeholders = ','.join(['%s'] * len(scene_ids))
-            face_matches = fetch_all(f"""
-                SELECT DISTINCT scene_id, embedding
-                FROM faces
-                WHERE scene_id IN ({placeholders})
-            """, tuple(scene_ids))
-            
-            # Calculate face similarities
-            scene_face_sims = {}
-            for fm in face_matches:
-                face_emb = fm.get('embedding')
-                if face_emb is not None:
-                    similarity = float(np.dot(ref_emb, face_emb))
-                    scene_id = fm['scene_id']
-                    if scene_id not in scene_face_sims or similarity > scene_face_sims[scene_id]:
-                        scene_face_sims[scene_id] = similarity
+            # Best face similarity per scene, computed natively by pgvector.
+            # Face embeddings are L2-normalized at detection, so the inner product
+            # is the cosine similarity (<#> returns the negative inner product).
+            face_matches = fetch_all_tuples("""
+                SELECT f.scene_id, MAX(-(f.embedding <#> ref.embedding)) AS similarity
+                FROM faces f, (SELECT embedding FROM faces WHERE id = %s) ref
+                WHERE f.scene_id = ANY(%s)
+                GROUP BY f.scene_id
+            """, (face_id, scene_ids))
+            scene_face_sims = dict(face_matches)
             
             # Filter by threshold
             filtered = []
@@ -531,34 +550,23 @@ async def search(
     if transcript_semantic:
         text_embedding = embed_transcript_text(transcript_semantic)
         if text_embedding:
-            text_emb_np = np.array(text_embedding)
-            
             # Get transcript embeddings for current results
             scene_ids = [s['id'] for s in results]
             if scene_ids:
-                placeholders = ','.join(['%s'] * len(scene_ids))
-                transcript_embeddings = fetch_all(f"""
-                    SELECT scene_id, embedding
+                transcript_embeddings = fetch_all_tuples("""
+                    SELECT scene_id, vector_send(embedding) AS embedding
                     FROM embeddings
-                    WHERE scene_id IN ({placeholders}) AND model_name = 'sentence-transformer'
-                """, tuple(scene_ids))
+                    WHERE scene_id = ANY(%s) AND model_name = 'sentence-transformer'
+                """, (scene_ids,))
                 
                 # Build scene_id -> embedding map
-                scene_transcript_embs = {te['scene_id']: te['embedding'] for te in transcript_embeddings}
+                scene_transcript_embs = dict(transcript_embeddings)
                 
-                # Filter by semantic similarity
-                filtered = []
-                for scene in results:
-                    emb = scene_transcript_embs.get(scene['id'])
-                    if emb is not None:
-                        similarity = float(np.dot(text_emb_np, emb))
-                        if similarity >= transcript_threshold:
-                            scene['transcript_similarity'] = similarity
-                            filtered.append(scene)
-                
-                # Sort by transcript similarity
-                filtered.sort(key=lambda x: x.get('transcript_similarity', 0), reverse=True)
-                results = filtered
+                # Filter and sort by semantic similarity
+                results = filter_by_similarity(
+                    results, text_embedding, [scene_transcript_embs.get(scene['id']) for scene in results],
+                    transcript_threshold, 'transcript_similarity'
+                )
     
     # Add faces to results
     for scene in results:
@@ -1005,6 +1013,10 @@ async def set_config(key: str, body: ConfigValue):
             (key, json.dumps(body.value))
         )
     
+    # Wake the ingest service's sleep loop (it LISTENs on this channel)
+    if key == 'indexer_state':
+        execute("SELECT pg_notify('indexer_state', %s)", (json.dumps(body.value),))
+    
     return {"success": True, "key": key, "value": body.value}
 
 